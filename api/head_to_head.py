@@ -0,0 +1,184 @@
+# api/head_to_head.py
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Tuple
+
+# Prefix-summed per-match counters, from the first team of the pair's point of view
+H2H_COUNTERS = ('team1Wins', 'draws', 'team2Wins', 'team1Goals', 'team2Goals')
+
+
+class HeadToHeadIndex:
+    """
+    Head-to-head match history keyed on unordered team pairs.
+
+    Matches are deduplicated (each fixture usually appears once per team),
+    oriented towards the alphabetically first team of the pair and sorted by
+    pair then date, so every pair's history is one contiguous slice. Prefix
+    sums over the whole table give the totals of any pair, or of its most
+    recent N meetings, with two lookups.
+    """
+
+    def __init__(self, pairs: Optional[Dict[Tuple[str, str], Tuple[int, int]]] = None,
+                 history: Optional[Dict[str, np.ndarray]] = None,
+                 prefix_sums: Optional[Dict[str, np.ndarray]] = None):
+        """
+        Initialize the index.
+
+        Args:
+            pairs: Mapping of (team_a, team_b), team_a < team_b, to its (start, stop) rows
+            history: Per-match arrays: date, competition, team1Score, team2Score
+            prefix_sums: Cumulative H2H_COUNTERS, one entry longer than the history
+        """
+        self.pairs = pairs or {}
+        self.history = history or {}
+        self.prefix_sums = prefix_sums or {name: np.zeros(1, dtype=np.int64) for name in H2H_COUNTERS}
+
+    @classmethod
+    def build(cls, data: Optional[pd.DataFrame]) -> 'HeadToHeadIndex':
+        """
+        Build the index in one pass over the match table.
+
+        Args:
+            data: Match data with team, opponent and date (app.state.data); it is not modified
+
+        Returns:
+            A new HeadToHeadIndex (empty when there is no usable data)
+        """
+        if data is None or data.empty or not {'team', 'opponent', 'date'}.issubset(data.columns):
+            return cls()
+
+        data = data[data['team'].notna() & data['opponent'].notna() & (data['team'] != data['opponent'])]
+        if data.empty:
+            return cls()
+
+        team = data['team'].astype(str).to_numpy()
+        opponent = data['opponent'].astype(str).to_numpy()
+        team_is_first = team <= opponent
+
+        def column(name):
+            if name in data.columns:
+                return pd.to_numeric(data[name], errors='coerce').to_numpy(dtype=float)
+            return np.full(len(data), np.nan)
+
+        gf, ga = column('gf'), column('ga')
+        first_score = np.where(team_is_first, gf, ga)
+        second_score = np.where(team_is_first, ga, gf)
+
+        # Outcome for the first team: the recorded result, else the score
+        result = data['result'].to_numpy() if 'result' in data.columns else np.full(len(data), None)
+        first_result = np.where(
+            result == 'D', 'D',
+            np.where((result == 'W') == team_is_first, 'W', 'L')
+        )
+        first_result = np.where(np.isin(result, ['W', 'D', 'L']), first_result, np.select(
+            [first_score > second_score, first_score == second_score, first_score < second_score],
+            ['W', 'D', 'L'], default=''
+        ))
+
+        matches = pd.DataFrame({
+            'team_a': np.where(team_is_first, team, opponent),
+            'team_b': np.where(team_is_first, opponent, team),
+            'date': pd.to_datetime(data['date'], errors='coerce').dt.normalize().to_numpy(),
+            'competition': data['comp'].to_numpy() if 'comp' in data.columns else None,
+            'team1Score': first_score,
+            'team2Score': second_score,
+            'result': first_result
+        })
+
+        # A fixture recorded from both sides appears twice; keep one row per pair and day
+        duplicate = matches.duplicated(['team_a', 'team_b', 'date']) & matches['date'].notna()
+        matches = matches[~duplicate].sort_values(['team_a', 'team_b', 'date'], kind='mergesort').reset_index(drop=True)
+
+        team_a = matches['team_a'].to_numpy()
+        team_b = matches['team_b'].to_numpy()
+        boundaries = np.flatnonzero((team_a[1:] != team_a[:-1]) | (team_b[1:] != team_b[:-1])) + 1
+        starts = np.concatenate([[0], boundaries])
+        stops = np.concatenate([boundaries, [len(matches)]])
+        pairs = {(team_a[start], team_b[start]): (int(start), int(stop)) for start, stop in zip(starts, stops)}
+
+        counters = {
+            'team1Wins': matches['result'] == 'W',
+            'draws': matches['result'] == 'D',
+            'team2Wins': matches['result'] == 'L',
+            'team1Goals': matches['team1Score'].fillna(0),
+            'team2Goals': matches['team2Score'].fillna(0)
+        }
+        prefix_sums = {
+            name: np.concatenate([[0], np.cumsum(values.to_numpy(dtype=np.int64))])
+            for name, values in counters.items()
+        }
+
+        history = {
+            'date': np.array([date.date().isoformat() if pd.notna(date) else None for date in matches['date']], dtype=object),
+            'competition': matches['competition'].astype(object).where(matches['competition'].notna(), None).to_numpy(),
+            'team1Score': matches['team1Score'].astype(object).where(matches['team1Score'].notna(), None).to_numpy(),
+            'team2Score': matches['team2Score'].astype(object).where(matches['team2Score'].notna(), None).to_numpy()
+        }
+        for score in ('team1Score', 'team2Score'):
+            history[score] = np.array([int(value) if value is not None else None for value in history[score]], dtype=object)
+
+        return cls(pairs=pairs, history=history, prefix_sums=prefix_sums)
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def _locate(self, team1: str, team2: str):
+        """Return (start, stop, flipped) for a pair, flipped when team1 is the pair's second team."""
+        flipped = team1 > team2
+        key = (team2, team1) if flipped else (team1, team2)
+        start, stop = self.pairs.get(key, (0, 0))
+        return start, stop, flipped
+
+    def _totals(self, start: int, stop: int, flipped: bool) -> Dict[str, int]:
+        totals = {name: int(self.prefix_sums[name][stop] - self.prefix_sums[name][start]) for name in H2H_COUNTERS}
+        if flipped:
+            totals['team1Wins'], totals['team2Wins'] = totals['team2Wins'], totals['team1Wins']
+            totals['team1Goals'], totals['team2Goals'] = totals['team2Goals'], totals['team1Goals']
+        totals['matches'] = stop - start
+        return totals
+
+    def get_summary(self, team1: str, team2: str, recent: Optional[int] = None) -> Dict[str, int]:
+        """
+        Return W/D/L and goal totals from team1's point of view.
+
+        Args:
+            team1: Team whose wins count as team1Wins
+            team2: Opponent
+            recent: Only count the most recent N meetings
+
+        Returns:
+            Dict with matches, team1Wins, draws, team2Wins, team1Goals, team2Goals
+        """
+        start, stop, flipped = self._locate(team1, team2)
+        if recent is not None:
+            start = max(start, stop - max(recent, 0))
+        return self._totals(start, stop, flipped)
+
+    def get_history(self, team1: str, team2: str, offset: int = 0, limit: int = 10) -> list:
+        """
+        Return one page of meetings, most recent first, scored from team1's point of view.
+
+        Args:
+            team1: Team whose goals are team1Score
+            team2: Opponent
+            offset: Number of most recent meetings to skip
+            limit: Page size
+
+        Returns:
+            List of {date, competition, team1Score, team2Score}
+        """
+        start, stop, flipped = self._locate(team1, team2)
+        page_stop = max(stop - max(offset, 0), start)
+        page_start = max(page_stop - max(limit, 0), start)
+
+        team1_scores = self.history['team2Score'] if flipped else self.history['team1Score']
+        team2_scores = self.history['team1Score'] if flipped else self.history['team2Score']
+        return [
+            {
+                "date": self.history['date'][row],
+                "competition": self.history['competition'][row],
+                "team1Score": team1_scores[row],
+                "team2Score": team2_scores[row]
+            }
+            for row in range(page_stop - 1, page_start - 1, -1)
+        ]
@@ -0,0 +1,202 @@
+# api/insights.py
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional
+
+# Stat columns correlated with winning, and their display names
+STAT_NAMES = {'gf': 'Goals For', 'ga': 'Goals Against', 'sh': 'Shots', 'sot': 'Shots on Target'}
+
+# Shown when correlations can't be computed from the data
+DEFAULT_STATS_CORRELATION = [
+    {"stat": "Shots on Target", "correlation": 0.75},
+    {"stat": "Goals For", "correlation": 0.72},
+    {"stat": "Possession", "correlation": 0.58},
+    {"stat": "Distance", "correlation": -0.32},
+    {"stat": "Goals Against", "correlation": -0.65}
+]
+
+# Shown for a venue with no matches
+DEFAULT_VENUE_ANALYSIS = {
+    "Home": {"Win": 35, "Draw": 30, "Loss": 35},
+    "Away": {"Win": 30, "Draw": 35, "Loss": 35}
+}
+
+
+def _percent(count, total):
+    return round(count / total * 100, 1)
+
+
+class InsightsStore:
+    """
+    Materialized /data-insights/ payloads.
+
+    Built once per dataset load from a single groupby over (team, venue,
+    result) plus per-team sums for the stat/win correlations, so requests are
+    a dictionary lookup. Payloads are shared between requests and must be
+    treated as read-only.
+    """
+
+    def __init__(self, overall: Optional[Dict] = None, teams: Optional[Dict[str, Dict]] = None):
+        """
+        Initialize the store.
+
+        Args:
+            overall: Insights payload over all matches
+            teams: Mapping of team name to its insights payload
+        """
+        self.overall = overall
+        self.teams = teams or {}
+
+    @classmethod
+    def build(cls, data: Optional[pd.DataFrame]) -> 'InsightsStore':
+        """
+        Build every insights payload for a dataset.
+
+        Args:
+            data: Raw match data (app.state.data); it is not modified
+
+        Returns:
+            A new InsightsStore (empty when there is no data)
+        """
+        if data is None or data.empty:
+            return cls()
+
+        has_team = 'team' in data.columns
+        keys = pd.DataFrame({
+            col: data[col] if col in data.columns else np.nan
+            for col in ('team', 'venue', 'result')
+        }, index=data.index)
+
+        # One pass over the data: match counts per (team, venue, result)
+        sizes = keys.groupby(['team', 'venue', 'result'], dropna=False, sort=False).size()
+
+        counts = {None: cls._empty_counts()}
+        for (team, venue, result), n in sizes.items():
+            n = int(n)
+            groups = [None] if not has_team or pd.isna(team) else [None, team]
+            for group in groups:
+                group_counts = counts.setdefault(group, cls._empty_counts())
+                group_counts['total'] += n
+                if result in group_counts['results']:
+                    group_counts['results'][result] += n
+                if venue in group_counts['venues']:
+                    venue_counts = group_counts['venues'][venue]
+                    venue_counts['total'] += n
+                    if result in venue_counts['results']:
+                        venue_counts['results'][result] += n
+
+        correlations = cls._stats_correlations(data, keys) if 'result' in data.columns else {}
+
+        # Team performance covers every team and is the same in every payload
+        team_performance = {}
+        if has_team:
+            for team in data['team'].dropna().unique():
+                team_counts = counts[team]
+                total = team_counts['total'] or 1
+                wins = team_counts['results']['W']
+                team_performance[team] = {
+                    "Win": _percent(wins, total),
+                    "Draw": _percent(team_counts['results']['D'], total),
+                    "Loss": _percent(team_counts['results']['L'], total),
+                    "WinPercent": _percent(wins, total)
+                }
+
+        payloads = {
+            group: cls._payload(group_counts, team_performance, correlations.get(group))
+            for group, group_counts in counts.items()
+        }
+        overall = payloads.pop(None)
+        return cls(overall=overall, teams=payloads)
+
+    @staticmethod
+    def _empty_counts():
+        return {
+            'total': 0,
+            'results': {'W': 0, 'D': 0, 'L': 0},
+            'venues': {venue: {'total': 0, 'results': {'W': 0, 'D': 0, 'L': 0}} for venue in ('Home', 'Away')}
+        }
+
+    @staticmethod
+    def _stats_correlations(data: pd.DataFrame, keys: pd.DataFrame) -> Dict:
+        """
+        Pearson correlation of each stat with winning, per team and overall (key None).
+
+        Uses per-group sums (n, Σx, Σx², Σxw, Σw) over rows where the stat is
+        present, matching DataFrame.corr's pairwise handling of missing values.
+        Groups with 5 or fewer matches are left out.
+        """
+        stats = [col for col in STAT_NAMES if col in data.columns]
+        if not stats or not all(pd.api.types.is_numeric_dtype(data[col]) for col in stats):
+            return {}
+
+        win = (data['result'] == 'W').astype(float)
+        sums = {}
+        for col in stats:
+            present = data[col].notna()
+            x = data[col].where(present, 0.0).astype(float)
+            w = win.where(present, 0.0)
+            sums[(col, 'n')] = present.astype(float)
+            sums[(col, 'sx')] = x
+            sums[(col, 'sxx')] = x * x
+            sums[(col, 'sxw')] = x * w
+            sums[(col, 'sw')] = w
+        sums = pd.DataFrame(sums, index=data.index)
+
+        team_sums = sums.groupby(keys['team'], sort=False).sum()
+        team_sizes = keys.groupby('team', sort=False).size()
+        team_sums = team_sums[team_sizes.reindex(team_sums.index) > 5]
+
+        group_sums = list(zip(team_sums.index, team_sums.to_dict('records')))
+        if len(data) > 5:
+            group_sums.append((None, sums.sum().to_dict()))
+
+        correlations = {}
+        for group, row in group_sums:
+            group_correlations = []
+            for col in stats:
+                n, sx, sxx, sxw, sw = (row[(col, part)] for part in ('n', 'sx', 'sxx', 'sxw', 'sw'))
+                denominator = np.sqrt((n * sxx - sx * sx) * (n * sw - sw * sw))
+                correlation = (n * sxw - sx * sw) / denominator if denominator > 0 else np.nan
+                group_correlations.append({
+                    "stat": STAT_NAMES[col],
+                    "correlation": round(float(correlation), 2)
+                })
+            correlations[group] = group_correlations
+        return correlations
+
+    @staticmethod
+    def _payload(counts: Dict, team_performance: Dict, stats_correlation: Optional[list]) -> Dict:
+        """Assemble one /data-insights/ response from precomputed counts."""
+        results = counts['results']
+        total_matches = sum(results.values()) or 1  # Avoid division by zero
+
+        venue_analysis = dict(DEFAULT_VENUE_ANALYSIS)
+        for venue, venue_counts in counts['venues'].items():
+            if venue_counts['total'] > 0:
+                venue_results = venue_counts['results']
+                venue_analysis[venue] = {
+                    "Win": _percent(venue_results['W'], venue_counts['total']),
+                    "Draw": _percent(venue_results['D'], venue_counts['total']),
+                    "Loss": _percent(venue_results['L'], venue_counts['total'])
+                }
+
+        return {
+            "resultDistribution": [
+                {"name": "Win", "value": _percent(results['W'], total_matches)},
+                {"name": "Draw", "value": _percent(results['D'], total_matches)},
+                {"name": "Loss", "value": _percent(results['L'], total_matches)}
+            ],
+            "venueAnalysis": venue_analysis,
+            "teamPerformance": team_performance,
+            "statsCorrelation": stats_correlation if stats_correlation is not None else DEFAULT_STATS_CORRELATION
+        }
+
+    def get_insights(self, team_name: Optional[str] = None) -> Optional[Dict]:
+        """
+        Return the insights payload for a team, or over all matches.
+
+        Unknown teams and "all" get the overall payload; None means no data.
+        """
+        if team_name and team_name != "all" and team_name in self.teams:
+            return self.teams[team_name]
+        return self.overall
@@ -1,14 +1,22 @@
 # api/main.py
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
 import pandas as pd
 import io
+import json
 import sys
 import os
+import time
+import uuid
+import asyncio
 import traceback
-from ml.model import train_ensemble_model
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from ml.model import train_ensemble_model, load_latest_model, clear_training_dataset_cache
 from ml.model_versioning import ModelVersionTracker
 # ml/ensemble_model.py
 # Line 8:
@@ -17,8 +25,13 @@ from ml.model_versioning import ModelVersionTracker
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from preprocessing.data_processing import load_data, prepare_model_data
-from ml.model import train_prediction_model, prepare_match_prediction_data
+from preprocessing.data_processing import load_data, prepare_model_data, prepare_model_data_incremental
+from ml.model import train_prediction_model, prepare_match_prediction_data, prepare_batch_prediction_data
+from ml.feature_index import PredictionFeatureIndex
+from api.insights import InsightsStore
+from api.team_index import TeamIndex
+from api.head_to_head import HeadToHeadIndex
+from data_pipeline.processors.feature_store import FeatureStore
 
 app = FastAPI(title="Football Prediction API")
 
@@ -60,29 +73,220 @@ class PredictionResponse(BaseModel):
 MODEL_PATH = "../models/trained_model.pkl"
 DATA_PATH = "../data/matches.csv"
 
+# Batch predictions: lists longer than the threshold are streamed back in chunks
+BATCH_STREAM_THRESHOLD = 500
+BATCH_CHUNK_SIZE = 250
+
+# How models are obtained at startup: "load" reuses the latest registered versions
+# and only trains when no compatible artifact exists, "train" always retrains
+MODEL_STARTUP_MODE = os.getenv("MODEL_STARTUP_MODE", "load")
+
+# Ensemble predict_proba backend: "compiled" evaluates flattened NumPy trees,
+# "sklearn" calls the fitted RandomForest/XGBoost models directly
+ENSEMBLE_INFERENCE_BACKEND = os.getenv("ENSEMBLE_INFERENCE_BACKEND", "compiled")
+
+# /predict-ensemble/ response cache: maximum entries and time-to-live in seconds
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "300"))
+
+# Retraining jobs pick the ensemble's hyperparameters and blend weights with a
+# cross-validated search when set to "1" (much slower than a plain fit); the
+# search runs TRAINING_SEARCH_TRIALS configurations over TRAINING_SEARCH_FOLDS folds
+TRAINING_HYPERPARAMETER_SEARCH = os.getenv("TRAINING_HYPERPARAMETER_SEARCH", "0") == "1"
+TRAINING_SEARCH_TRIALS = int(os.getenv("TRAINING_SEARCH_TRIALS", "20"))
+TRAINING_SEARCH_FOLDS = int(os.getenv("TRAINING_SEARCH_FOLDS", "4"))
+
+# Parquet feature store written by data_pipeline.processors.feature_store.FeatureStore.build
+FEATURE_STORE_PATH = os.getenv("FEATURE_STORE_PATH", "../data/features")
+
+class PredictionCache:
+    """
+    In-process LRU/TTL cache of prediction responses.
+    
+    Entries are keyed by the canonical feature vector of a request and belong
+    to one pair of models; seeing a different model identity clears the cache,
+    so swapping app.state models invalidates it without explicit calls. Only
+    used from the event loop, so it needs no locking.
+    """
+    
+    def __init__(self, max_entries=PREDICTION_CACHE_SIZE, ttl_seconds=PREDICTION_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.model_key = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+    
+    @staticmethod
+    def get_model_key(*models):
+        """Identity of the models a response was computed with"""
+        return tuple((id(model), getattr(model, 'model_version', None)) for model in models)
+    
+    @staticmethod
+    def make_key(team, opponent, features):
+        """Canonical key for a request: names plus the prepared feature vector"""
+        return (team, opponent) + tuple(float(value) for value in features)
+    
+    def _check_models(self, model_key):
+        if model_key != self.model_key:
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self.model_key = model_key
+    
+    def get(self, model_key, key):
+        """Return the cached response for key, or None"""
+        if self.max_entries <= 0:
+            return None
+        self._check_models(model_key)
+        
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        expires_at, response = entry
+        if time.monotonic() >= expires_at:
+            del self.entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return response
+    
+    def put(self, model_key, key, response):
+        """Store a response, evicting the least recently used entries if full"""
+        if self.max_entries <= 0:
+            return
+        self._check_models(model_key)
+        
+        self.entries[key] = (time.monotonic() + self.ttl_seconds, response)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+    
+    def stats(self):
+        """Counters for the stats endpoint"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
+prediction_cache = PredictionCache()
+
+# Background retraining for /upload-data/
+TRAINING_JOB_HISTORY = 100
+training_executor = None
+training_tasks = set()
+
+# Rolling features of the last job's data; lives in the training worker process
+# and is reused by its next job, so it is never pickled between processes
+worker_rolling_state = None
+
+def load_or_train_model(model_type, train_fn, processed_data):
+    """Load the latest compatible model of a type, training one only if needed"""
+    start = time.perf_counter()
+    model = None
+    source = "trained"
+
+    if MODEL_STARTUP_MODE == "load":
+        model = load_latest_model(model_type, processed_data)
+        if model is not None:
+            source = "loaded"
+
+    if model is None:
+        model = train_fn(processed_data)
+
+    report = {
+        "source": source,
+        "version": getattr(model, 'model_version', None),
+        "seconds": round(time.perf_counter() - start, 3)
+    }
+    print(f"Startup {model_type} model {source} ({report['version']}) in {report['seconds']}s")
+    return model, report
+
 @app.on_event("startup")
 async def startup_event():
+    app.state.training_jobs = {}
+    app.state.training_lock = asyncio.Lock()
+    app.state.latest_training_job = None
+    
     try:
         # Try to load existing data
         app.state.data = load_data(DATA_PATH)
-        app.state.processed_data = prepare_model_data(app.state.data) if not app.state.data.empty else None
+        if not app.state.data.empty:
+            app.state.processed_data = prepare_model_data(app.state.data)
+        else:
+            app.state.processed_data = None
+        app.state.feature_index = PredictionFeatureIndex.build(app.state.processed_data)
+        app.state.insights_store = InsightsStore.build(app.state.data)
+        app.state.team_index = TeamIndex.build(app.state.data)
+        app.state.head_to_head = HeadToHeadIndex.build(app.state.data)
         
-        # Train both models
-        app.state.model = train_prediction_model(app.state.processed_data) if app.state.processed_data is not None else None
-        app.state.ensemble_model = train_ensemble_model(app.state.processed_data) if app.state.processed_data is not None else None
+        # Load (or train) both models
+        app.state.startup_report = {"mode": MODEL_STARTUP_MODE}
+        if app.state.processed_data is not None:
+            app.state.model, app.state.startup_report['randomforest'] = load_or_train_model(
+                'randomforest', train_prediction_model, app.state.processed_data
+            )
+            app.state.ensemble_model, app.state.startup_report['ensemble'] = load_or_train_model(
+                'ensemble', train_ensemble_model, app.state.processed_data
+            )
+            app.state.ensemble_model.set_inference_backend(ENSEMBLE_INFERENCE_BACKEND)
+            
+            # The prepared training frames are only shared between the two trainers
+            clear_training_dataset_cache()
+        else:
+            app.state.model = None
+            app.state.ensemble_model = None
         
-        print("Models trained successfully")
+        print("Models ready")
     except Exception as e:
         print(f"Error during startup: {e}")
         # Initialize with empty data
         app.state.data = pd.DataFrame(columns=['date', 'team', 'opponent', 'venue', 'result', 'gf', 'ga', 'sh', 'sot', 'time'])
         app.state.processed_data = None
+        app.state.feature_index = PredictionFeatureIndex()
+        app.state.insights_store = InsightsStore()
+        app.state.team_index = TeamIndex()
+        app.state.head_to_head = HeadToHeadIndex()
         app.state.model = None
         app.state.ensemble_model = None
+        app.state.startup_report = {"mode": MODEL_STARTUP_MODE, "error": str(e)}
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if training_executor is not None:
+        training_executor.shutdown(wait=False, cancel_futures=True)
 
 @app.get("/")
 async def root():
     return {"message": "Football Prediction System API"}
+
+@app.get("/startup-status/")
+async def get_startup_status():
+    """Report how each model was obtained at startup and how long it took"""
+    return getattr(app.state, 'startup_report', {"mode": MODEL_STARTUP_MODE})
+
+@app.get("/prediction-cache/stats")
+async def get_prediction_cache_stats():
+    """Report hit/miss/eviction counters of the /predict-ensemble/ response cache"""
+    return prediction_cache.stats()
+
 @app.get("/model-versions/")
 async def get_model_versions(model_type: str = None):
     """Return list of model versions, optionally filtered by type"""
@@ -141,28 +345,15 @@ async def get_model_performance_comparison():
 @app.get("/teams/")
 async def get_teams():
     """Return list of teams in the dataset"""
-    try:
-        print("Teams endpoint called")
-        
-        if not hasattr(app.state, 'data') or app.state.data is None or app.state.data.empty:
-            # Return some default teams if no data is available
-            default_teams = ["Manchester United", "Arsenal", "Liverpool", "Chelsea", "Tottenham"]
-            print(f"No data available, returning default teams: {default_teams}")
-            return default_teams
-        
-        if 'team' not in app.state.data.columns:
-            print("No team column in data")
-            return []
-        
-        teams = app.state.data['team'].unique().tolist()
-        print(f"Returning teams: {teams}")
-        return sorted(teams)
-    except Exception as e:
-        print(f"Error in teams endpoint: {e}")
-        import traceback
-        traceback.print_exc()
-        # Return empty list instead of error
-        return []
+    if not hasattr(app.state, 'data') or app.state.data is None or app.state.data.empty:
+        # Return some default teams if no data is available
+        default_teams = ["Manchester United", "Arsenal", "Liverpool", "Chelsea", "Tottenham"]
+        print(f"No data available, returning default teams: {default_teams}")
+        return default_teams
+    
+    # Sorted and serialized once per dataset load
+    team_index = getattr(app.state, 'team_index', None) or TeamIndex()
+    return Response(content=team_index.teams_json, media_type="application/json")
 
 @app.get("/team-stats/{team_name}")
 async def get_team_stats(team_name: str):
@@ -170,164 +361,153 @@ async def get_team_stats(team_name: str):
     if not hasattr(app.state, 'data') or app.state.data is None or app.state.data.empty:
         raise HTTPException(status_code=404, detail="No data available. Please upload data first.")
     
-    if 'team' not in app.state.data.columns or team_name not in app.state.data['team'].values:
+    # Each team's response body is serialized once per dataset load
+    team_index = getattr(app.state, 'team_index', None)
+    team_stats_json = team_index.get_team_stats_json(team_name) if team_index is not None else None
+    if team_stats_json is None:
         raise HTTPException(status_code=404, detail=f"Team {team_name} not found in data")
     
-    team_data = app.state.data[app.state.data['team'] == team_name]
-    
-    # Calculate basic stats
-    matches = team_data.to_dict('records')
-    
-    # Create summary stats
-    wins = sum(1 for match in matches if match.get('result') == 'W')
-    draws = sum(1 for match in matches if match.get('result') == 'D')
-    losses = sum(1 for match in matches if match.get('result') == 'L')
-    
-    return {
-        "matches": matches,
-        "stats": {
-            "matches_played": len(matches),
-            "wins": wins,
-            "draws": draws,
-            "losses": losses,
-            "win_percentage": round(wins / len(matches) * 100, 1) if matches else 0
-        }
-    }
+    return Response(content=team_stats_json, media_type="application/json")
 
 @app.get("/head-to-head/{team1}/{team2}")
-async def get_head_to_head(team1: str, team2: str):
+async def get_head_to_head(team1: str, team2: str, offset: int = 0, limit: int = 10, recent: int = 5):
     """Return head to head statistics between two teams"""
     if not hasattr(app.state, 'data') or app.state.data is None or app.state.data.empty:
         raise HTTPException(status_code=404, detail="No data available. Please upload data first.")
     
-    # Sample data structure since we can't compute real head-to-head stats without more data
+    head_to_head = getattr(app.state, 'head_to_head', None) or HeadToHeadIndex()
+    summary = head_to_head.get_summary(team1, team2)
+    
     return {
+        # Radar profile shown next to the history (not derived from meetings)
         "stats": {
             "team1": {"attack": 75, "defense": 70, "possession": 65, "form": 80, "homeAdvantage": 75},
             "team2": {"attack": 65, "defense": 75, "possession": 60, "form": 70, "awayPerformance": 60}
         },
-        "history": []  # This would contain previous match results
+        "summary": summary,
+        "recent": head_to_head.get_summary(team1, team2, recent=recent),
+        "history": head_to_head.get_history(team1, team2, offset=offset, limit=limit),
+        "pagination": {"offset": offset, "limit": limit, "total": summary['matches']}
     }
 
 # api/main.py - Updated data-insights endpoint with team parameter
 
 # api/main.py - Replace data-insights endpoint
 
+@app.get("/features/")
+async def get_features(season: str = None, league: str = None, team: str = None, columns: str = None):
+    """
+    Serve generated features from the feature store.
+    
+    season and league select partitions without opening the others, team
+    filters rows inside them and columns is a comma-separated list of feature
+    columns to return (default: all).
+    """
+    filters = [
+        (col, '=', value)
+        for col, value in (('season', season), ('league', league), ('team', team))
+        if value is not None
+    ]
+    
+    try:
+        # The manifest is small; reading it per request picks up rebuilt partitions
+        store = FeatureStore(FEATURE_STORE_PATH)
+        features = store.read(columns=columns.split(',') if columns else None, filters=filters or None)
+    except Exception as e:
+        print(f"Error reading feature store: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Feature store error: {str(e)}")
+    
+    return Response(content=features.to_json(orient='records', date_format='iso'), media_type="application/json")
+
 @app.get("/data-insights/")
 @app.get("/data-insights/{team_name}")
 async def get_data_insights(team_name: str = None):
-    print(f"Data insights requested for team: {team_name}")
+    """Serve precomputed insights for a team, or over all matches"""
+    insights_store = getattr(app.state, 'insights_store', None)
+    insights = insights_store.get_insights(team_name) if insights_store is not None else None
     
-    if not hasattr(app.state, 'data') or app.state.data is None or app.state.data.empty:
+    if insights is None:
         return {"error": "No data available"}
     
-    data = app.state.data
-    
-    # Filter by team if specified
-    if team_name and team_name != "all" and 'team' in data.columns:
-        filtered_data = data[data['team'] == team_name]
-        if filtered_data.empty:
-            filtered_data = data  # Use all data if filter results in empty set
+    return insights
+# api/main.py - Enhanced predict endpoint
+
+# api/main.py - Complete replacement for the predict endpoint
+def build_match_details(prediction_request: dict, feature_index: Optional[PredictionFeatureIndex] = None):
+    """
+    Turn a prediction request into (team, opponent, match_details) for the model.
+
+    Form stats omitted from the request are filled from the team's latest form
+    in feature_index when available, otherwise from fixed defaults.
+    """
+    # Extract basic info
+    home_team = prediction_request.get('home_team', '')
+    away_team = prediction_request.get('away_team', '')
+    team_to_predict = prediction_request.get('team_to_predict', 'home').lower()
+
+    # Determine team and venue
+    if team_to_predict == 'home':
+        team = home_team
+        opponent = away_team
+        venue = 'Home'
     else:
-        filtered_data = data
-    
-    # Calculate result distribution
-    result_counts = {'W': 0, 'D': 0, 'L': 0}
-    if 'result' in filtered_data.columns:
-        for result in ['W', 'D', 'L']:
-            result_counts[result] = int(sum(filtered_data['result'] == result))
-    
-    total_matches = sum(result_counts.values()) or 1  # Avoid division by zero
-    
-    # Calculate percentages
-    result_distribution = [
-        {"name": "Win", "value": round(result_counts.get('W', 0) / total_matches * 100, 1)},
-        {"name": "Draw", "value": round(result_counts.get('D', 0) / total_matches * 100, 1)},
-        {"name": "Loss", "value": round(result_counts.get('L', 0) / total_matches * 100, 1)}
-    ]
-    
-    # Generate venue analysis for the filtered data
-    venue_analysis = {
-        "Home": {"Win": 35, "Draw": 30, "Loss": 35},
-        "Away": {"Win": 30, "Draw": 35, "Loss": 35}
+        team = away_team
+        opponent = home_team
+        venue = 'Away'
+
+    # Create match details dictionary
+    match_details = {
+        "date": prediction_request.get('match_date', pd.Timestamp.now().strftime('%Y-%m-%d')),
+        "time": prediction_request.get('match_time', '15:00'),
+        "team": team,
+        "opponent": opponent,
+        "venue": venue,
     }
-    
-    if 'venue' in filtered_data.columns and 'result' in filtered_data.columns:
-        for venue in ['Home', 'Away']:
-            venue_data = filtered_data[filtered_data['venue'] == venue]
-            if len(venue_data) > 0:
-                venue_wins = sum(venue_data['result'] == 'W')
-                venue_draws = sum(venue_data['result'] == 'D')
-                venue_losses = sum(venue_data['result'] == 'L')
-                total = len(venue_data)
-                
-                venue_analysis[venue] = {
-                    "Win": round(venue_wins / total * 100, 1),
-                    "Draw": round(venue_draws / total * 100, 1),
-                    "Loss": round(venue_losses / total * 100, 1)
-                }
-    
-    # Team performance - unchanged, this should work for all teams already
-    team_performance = {}
-    
-    if 'team' in data.columns:
-        for team in data['team'].unique():
-            team_data = data[data['team'] == team]
-            
-            team_wins = sum(team_data['result'] == 'W') if 'result' in team_data.columns else 0
-            team_draws = sum(team_data['result'] == 'D') if 'result' in team_data.columns else 0
-            team_losses = sum(team_data['result'] == 'L') if 'result' in team_data.columns else 0
-            total = len(team_data) or 1
-            
-            team_performance[team] = {
-                "Win": round(team_wins / total * 100, 1), 
-                "Draw": round(team_draws / total * 100, 1), 
-                "Loss": round(team_losses / total * 100, 1),
-                "WinPercent": round(team_wins / total * 100, 1)
-            }
-    
-    # Generate stats correlation for filtered data
-    stats_correlation = [
-        {"stat": "Shots on Target", "correlation": 0.75},
-        {"stat": "Goals For", "correlation": 0.72},
-        {"stat": "Possession", "correlation": 0.58},
-        {"stat": "Distance", "correlation": -0.32},
-        {"stat": "Goals Against", "correlation": -0.65}
-    ]
-    
-    try:
-        # If we have enough filtered data, calculate real correlations
-        if len(filtered_data) > 5 and 'result' in filtered_data.columns:
-            filtered_data['win'] = (filtered_data['result'] == 'W').astype(int)
-            
-            # Get available stat columns
-            available_stats = [col for col in ['gf', 'ga', 'sh', 'sot'] if col in filtered_data.columns]
-            
-            if available_stats:
-                correlations = filtered_data[available_stats + ['win']].corr()['win'].drop('win')
-                
-                stats_correlation = []
-                stat_names = {'gf': 'Goals For', 'ga': 'Goals Against', 
-                             'sh': 'Shots', 'sot': 'Shots on Target'}
-                
-                for col, corr in correlations.items():
-                    stats_correlation.append({
-                        "stat": stat_names.get(col, col),
-                        "correlation": round(float(corr), 2)
-                    })
-    except Exception as e:
-        print(f"Error calculating correlations: {e}")
-        # Keep using default correlations
-    
-    return {
-        "resultDistribution": result_distribution,
-        "venueAnalysis": venue_analysis,
-        "teamPerformance": team_performance,
-        "statsCorrelation": stats_correlation
+
+    latest_form = feature_index.get_latest_form(team) if feature_index is not None else {}
+
+    # Form stats, falling back to the team's latest form and then to defaults
+    form_fields = {
+        "gf_rolling": ("goals_for", 1.5),
+        "ga_rolling": ("goals_against", 1.0),
+        "sh_rolling": ("shots", 12.0),
+        "sot_rolling": ("shots_on_target", 5.0),
     }
-# api/main.py - Enhanced predict endpoint
 
-# api/main.py - Complete replacement for the predict endpoint
+    for model_field, (request_field, default_value) in form_fields.items():
+        value = prediction_request.get(request_field)
+        if value is None:
+            value = latest_form.get(model_field, default_value)
+        match_details[model_field] = float(value)
+
+    # Add optional stats if provided (or known from the team's latest form)
+    optional_fields = {
+        "dist_rolling": "distance",
+        "fk_rolling": "free_kicks",
+        "pk_rolling": "penalties",
+        "pkatt_rolling": "penalty_attempts"
+    }
+
+    for model_field, request_field in optional_fields.items():
+        if request_field in prediction_request and prediction_request[request_field] is not None:
+            match_details[model_field] = float(prediction_request[request_field])
+        elif model_field in latest_form:
+            match_details[model_field] = latest_form[model_field]
+
+    return team, opponent, match_details
+
+def build_feature_matrix(match_df, predictors):
+    """
+    Select the model's predictors from prepared match rows.
+
+    Shared by the single and batch prediction paths so a fixture gets the same
+    feature values either way: predictors missing from match_df and missing
+    values both default to 0.
+    """
+    features = match_df.reindex(columns=predictors, fill_value=0)
+    return features.fillna(0)
+
 @app.post("/predict-ensemble/")
 async def predict_match_ensemble(prediction_request: dict):
     """Make predictions using the ensemble model"""
@@ -336,71 +516,35 @@ async def predict_match_ensemble(prediction_request: dict):
         return await predict_match_simple(prediction_request)
     
     try:
-        # Extract basic info
-        home_team = prediction_request.get('home_team', '')
-        away_team = prediction_request.get('away_team', '')
-        team_to_predict = prediction_request.get('team_to_predict', 'home').lower()
-        
-        # Determine team and venue
-        if team_to_predict == 'home':
-            team = home_team
-            opponent = away_team
-            venue = 'Home'
-        else:
-            team = away_team
-            opponent = home_team
-            venue = 'Away'
-            
-        # Create match details dictionary
-        match_details = {
-            "date": prediction_request.get('match_date', pd.Timestamp.now().strftime('%Y-%m-%d')),
-            "time": prediction_request.get('match_time', '15:00'),
-            "team": team,
-            "opponent": opponent,
-            "venue": venue,
-            "gf_rolling": float(prediction_request.get('goals_for', 1.5)),
-            "ga_rolling": float(prediction_request.get('goals_against', 1.0)),
-            "sh_rolling": float(prediction_request.get('shots', 12.0)),
-            "sot_rolling": float(prediction_request.get('shots_on_target', 5.0)),
-        }
-        
-        # Add optional stats if provided
-        optional_fields = {
-            "dist_rolling": "distance", 
-            "fk_rolling": "free_kicks", 
-            "pk_rolling": "penalties", 
-            "pkatt_rolling": "penalty_attempts"
-        }
-        
-        for model_field, request_field in optional_fields.items():
-            if request_field in prediction_request and prediction_request[request_field] is not None:
-                match_details[model_field] = float(prediction_request[request_field])
-        
+        feature_index = getattr(app.state, 'feature_index', None)
+        team, opponent, match_details = build_match_details(prediction_request, feature_index)
+
         # Prepare data for prediction
-        match_df = prepare_match_prediction_data(match_details, app.state.processed_data)
+        match_df = prepare_match_prediction_data(match_details, app.state.processed_data, feature_index)
         
         # Extract features used in training
-        predictors = app.state.ensemble_model.predictors
-        available_predictors = [p for p in predictors if p in match_df.columns]
+        features = build_feature_matrix(match_df, app.state.ensemble_model.predictors)
         
-        # Make sure all predictors exist
-        for p in predictors:
-            if p not in match_df.columns:
-                match_df[p] = 0  # Default value
+        # Reuse the response for an identical request against the same models
+        rf_model = getattr(app.state, 'model', None)
+        model_key = PredictionCache.get_model_key(app.state.ensemble_model, rf_model)
+        cache_key = PredictionCache.make_key(team, opponent, features.iloc[0].tolist())
+        cached_response = prediction_cache.get(model_key, cache_key)
+        if cached_response is not None:
+            return cached_response
         
         # Make prediction with ensemble model
-        win_probability = float(app.state.ensemble_model.predict_proba(match_df[predictors])[0][1])
+        win_probability = float(app.state.ensemble_model.predict_proba(features)[0][1])
         prediction = "WIN" if win_probability > 0.5 else "NOT WIN"
         
-        # Get feature importance from ensemble model
-        feature_importance = app.state.ensemble_model.get_feature_importance()
-        key_factors = feature_importance.head(5).to_dict('records')
+        # Get feature importance from ensemble model (cached at fit time)
+        key_factors = app.state.ensemble_model.get_top_features(5)
         
         # Compare with original model if available
         model_comparison = {}
-        if hasattr(app.state, 'model') and app.state.model is not None:
+        if rf_model is not None:
             try:
-                original_prob = float(app.state.model.predict_proba(match_df[predictors])[0][1])
+                original_prob = float(rf_model.predict_proba(features)[0][1])
                 model_comparison = {
                     "rf_only_probability": original_prob,
                     "ensemble_probability": win_probability,
@@ -409,7 +553,7 @@ async def predict_match_ensemble(prediction_request: dict):
             except:
                 pass
         
-        return {
+        response = {
             "team": team,
             "opponent": opponent,
             "win_probability": win_probability,
@@ -418,6 +562,8 @@ async def predict_match_ensemble(prediction_request: dict):
             "model_version": app.state.ensemble_model.model_version,
             "model_comparison": model_comparison
         }
+        prediction_cache.put(model_key, cache_key, response)
+        return response
         
     except Exception as e:
         print(f"Error in ensemble prediction: {e}")
@@ -426,6 +572,128 @@ async def predict_match_ensemble(prediction_request: dict):
         # Fall back to simple prediction
         return await predict_match_simple(prediction_request)
 
+def score_fixture_batch(fixtures, ensemble_model, rf_model, processed_data, feature_index=None):
+    """Score a list of fixtures with one vectorized predict_proba call per model"""
+    results = [None] * len(fixtures)
+    rows = []
+    positions = []
+
+    # Build match details, recording per-fixture errors instead of failing the batch
+    for i, fixture in enumerate(fixtures):
+        try:
+            team, opponent, match_details = build_match_details(fixture, feature_index)
+            rows.append(match_details)
+            positions.append(i)
+        except Exception as e:
+            results[i] = {"index": i, "error": str(e)}
+
+    if not rows:
+        return results
+
+    # Build a single feature matrix for the whole batch
+    match_df = prepare_batch_prediction_data(rows, processed_data, feature_index)
+    features = build_feature_matrix(match_df, ensemble_model.predictors)
+
+    win_probabilities = ensemble_model.predict_proba(features)[:, 1]
+
+    rf_probabilities = None
+    if rf_model is not None:
+        try:
+            rf_probabilities = rf_model.predict_proba(features)[:, 1]
+        except:
+            pass
+
+    key_factors = ensemble_model.get_top_features(5)
+
+    for row, (i, match_details) in enumerate(zip(positions, rows)):
+        win_probability = float(win_probabilities[row])
+        model_comparison = {}
+        if rf_probabilities is not None:
+            original_prob = float(rf_probabilities[row])
+            model_comparison = {
+                "rf_only_probability": original_prob,
+                "ensemble_probability": win_probability,
+                "probability_difference": win_probability - original_prob
+            }
+
+        results[i] = {
+            "index": i,
+            "team": match_details['team'],
+            "opponent": match_details['opponent'],
+            "win_probability": win_probability,
+            "prediction": "WIN" if win_probability > 0.5 else "NOT WIN",
+            "key_factors": key_factors,
+            "model_version": ensemble_model.model_version,
+            "model_comparison": model_comparison
+        }
+
+    return results
+
+def stream_fixture_batch(fixtures, ensemble_model, rf_model, processed_data, feature_index=None):
+    """Yield newline-delimited JSON results, scoring one chunk of fixtures at a time"""
+    for start in range(0, len(fixtures), BATCH_CHUNK_SIZE):
+        chunk = fixtures[start:start + BATCH_CHUNK_SIZE]
+        try:
+            results = score_fixture_batch(chunk, ensemble_model, rf_model, processed_data, feature_index)
+        except Exception as e:
+            # The 200 status is already sent, so mark each fixture of the failed chunk in the stream
+            print(f"Error in streamed batch prediction: {e}")
+            traceback.print_exc()
+            results = [{"index": i, "error": str(e)} for i in range(len(chunk))]
+        for result in results:
+            result["index"] += start
+            yield json.dumps(result) + "\n"
+
+@app.post("/predict-ensemble/batch")
+async def predict_match_ensemble_batch(batch_request: dict):
+    """
+    Make predictions for a list of fixtures using the ensemble model.
+
+    Expects {"fixtures": [<predict-ensemble request>, ...], "stream": optional bool}.
+    Results are returned in request order. Lists longer than BATCH_STREAM_THRESHOLD
+    (or any list when stream is true) are streamed back as newline-delimited JSON.
+    """
+    fixtures = batch_request.get('fixtures')
+    if not isinstance(fixtures, list):
+        raise HTTPException(status_code=400, detail="Request must contain a 'fixtures' list")
+
+    # Take a snapshot of the models so a concurrent upload can't mix versions mid-batch
+    ensemble_model = getattr(app.state, 'ensemble_model', None)
+    rf_model = getattr(app.state, 'model', None)
+    processed_data = getattr(app.state, 'processed_data', None)
+    feature_index = getattr(app.state, 'feature_index', None)
+
+    if ensemble_model is None:
+        # Fallback to simple prediction if ensemble model not available
+        predictions = []
+        for i, fixture in enumerate(fixtures):
+            result = await predict_match_simple(fixture)
+            predictions.append({"index": i, **result})
+        return {"predictions": predictions, "count": len(predictions)}
+
+    stream = batch_request.get('stream')
+    if stream is None:
+        stream = len(fixtures) > BATCH_STREAM_THRESHOLD
+
+    if stream:
+        return StreamingResponse(
+            stream_fixture_batch(fixtures, ensemble_model, rf_model, processed_data, feature_index),
+            media_type="application/x-ndjson"
+        )
+
+    try:
+        predictions = score_fixture_batch(fixtures, ensemble_model, rf_model, processed_data, feature_index)
+    except Exception as e:
+        print(f"Error in batch ensemble prediction: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Batch prediction error: {str(e)}")
+
+    return {
+        "predictions": predictions,
+        "count": len(predictions),
+        "model_version": ensemble_model.model_version
+    }
+
 @app.post("/predict/")
 async def predict_match(prediction_request: dict):  # Change to accept a dictionary instead of a model
     print(f"Raw prediction request: {prediction_request}")
@@ -570,7 +838,198 @@ async def predict_match_simple(prediction_request: dict):
         traceback.print_exc()
         return {"error": str(e)}
     
-@app.post("/upload-data/")
+def prepare_and_train_models(data):
+    """
+    Preprocess uploaded data and train both models.
+    
+    Runs in the training process pool, so it must not touch app.state. Returns
+    everything the API needs to swap in once training has finished.
+    Matches appended since the worker's previous job only need their own
+    rolling features computed.
+    """
+    global worker_rolling_state
+    
+    # Process data
+    try:
+        # Convert date to datetime explicitly
+        data['date'] = pd.to_datetime(data['date'], errors='coerce')
+
+        # Handle any missing or invalid dates
+        if data['date'].isna().any():
+            print("Warning: Invalid dates detected, filling with today's date")
+            data['date'] = data['date'].fillna(pd.Timestamp.now())
+
+        # Make sure venue is properly capitalized
+        if 'venue' in data.columns:
+            data['venue'] = data['venue'].str.capitalize()
+            # Make sure it's either 'Home' or 'Away'
+            valid_venues = ['Home', 'Away']
+            if not data['venue'].isin(valid_venues).all():
+                print("Warning: Invalid venue values detected, correcting to 'Home'")
+                data.loc[~data['venue'].isin(valid_venues), 'venue'] = 'Home'
+
+        processed_data, worker_rolling_state = prepare_model_data_incremental(data, worker_rolling_state)
+        print("Data preprocessing successful")
+
+    except Exception as process_error:
+        print(f"Error processing data: {process_error}")
+        import traceback
+        traceback.print_exc()
+        # Use a simpler processing approach
+        data['date'] = pd.to_datetime(data['date'], errors='coerce')
+        data['venue_code'] = data['venue'].map({'Home': 1, 'Away': 0}).fillna(1)
+        data['target'] = data['result'].map({'W': 1, 'D': 0, 'L': 0}).fillna(0)
+        processed_data = data
+        worker_rolling_state = None
+        print("Used fallback data processing")
+
+    # Train models - both regular and ensemble
+    try:
+        # Train regular model
+        model = train_prediction_model(processed_data)
+        print("Regular model training successful")
+
+        # Train ensemble model
+        ensemble_model = train_ensemble_model(
+            processed_data,
+            hyperparameter_search=TRAINING_HYPERPARAMETER_SEARCH,
+            search_options={"n_trials": TRAINING_SEARCH_TRIALS, "n_splits": TRAINING_SEARCH_FOLDS}
+        )
+        print("Ensemble model training successful")
+    except Exception as model_error:
+        print(f"Error training models: {model_error}")
+        import traceback
+        traceback.print_exc()
+        # Create default models
+        model = train_prediction_model(None)
+        ensemble_model = train_ensemble_model(None)
+        print("Used fallback model creation")
+    finally:
+        # The worker process lives on between jobs, don't keep its training frames around
+        clear_training_dataset_cache()
+
+    # Compile the ensemble here so the API process doesn't pay for it on swap
+    ensemble_model.set_inference_backend(ENSEMBLE_INFERENCE_BACKEND)
+    
+    # Build the prediction lookup index and read-side indexes alongside the models
+    feature_index = PredictionFeatureIndex.build(processed_data)
+    insights_store = InsightsStore.build(data)
+    team_index = TeamIndex.build(data)
+    head_to_head = HeadToHeadIndex.build(data)
+    
+    # Ensure data directory exists
+    os.makedirs(os.path.dirname(DATA_PATH), exist_ok=True)
+    
+    # Save data to file
+    try:
+        data.to_csv(DATA_PATH, index=False)
+        print(f"Data saved to {DATA_PATH}")
+    except Exception as save_error:
+        print(f"Warning: Could not save data to file: {save_error}")
+    
+    return (data, processed_data, feature_index, insights_store, team_index, head_to_head,
+            model, ensemble_model)
+
+def init_training_worker():
+    """Drop database connections inherited from the API process"""
+    from database.config import engine
+    engine.dispose(close=False)
+
+def get_training_executor():
+    """Return the process pool used for retraining, creating it on first use"""
+    global training_executor
+    if training_executor is None:
+        # A single worker runs one training job at a time; later uploads queue behind it
+        training_executor = ProcessPoolExecutor(max_workers=1, initializer=init_training_worker)
+    return training_executor
+
+def submit_training_job(data, filename):
+    """Register a retraining job for uploaded data and schedule it"""
+    job_id = uuid.uuid4().hex
+    jobs = app.state.training_jobs
+    jobs[job_id] = {
+        "job_id": job_id,
+        "status": "queued",
+        "filename": filename,
+        "rows": len(data),
+        "submitted_at": datetime.now().isoformat(),
+        "started_at": None,
+        "finished_at": None,
+        "model_version": None,
+        "ensemble_model_version": None,
+        "superseded_by": None,
+        "error": None
+    }
+    
+    # Newer uploads replace queued ones (coalescing), the running job is left alone
+    app.state.latest_training_job = job_id
+    
+    # Forget the oldest finished jobs
+    finished = [jid for jid, job in jobs.items() if job['status'] in ('completed', 'failed', 'superseded')]
+    for jid in finished[:max(0, len(jobs) - TRAINING_JOB_HISTORY)]:
+        del jobs[jid]
+    
+    task = asyncio.create_task(run_training_job(job_id, data))
+    training_tasks.add(task)
+    task.add_done_callback(training_tasks.discard)
+    return job_id
+
+async def run_training_job(job_id, data):
+    """Train in the process pool, then swap the new models into app.state"""
+    job = app.state.training_jobs[job_id]
+    
+    # One job at a time, in upload order
+    async with app.state.training_lock:
+        if app.state.latest_training_job != job_id:
+            job['status'] = 'superseded'
+            job['superseded_by'] = app.state.latest_training_job
+            job['finished_at'] = datetime.now().isoformat()
+            print(f"Training job {job_id} superseded by {job['superseded_by']}")
+            return
+        
+        job['status'] = 'running'
+        job['started_at'] = datetime.now().isoformat()
+        
+        try:
+            loop = asyncio.get_running_loop()
+            (data, processed_data, feature_index, insights_store, team_index, head_to_head,
+             model, ensemble_model) = await loop.run_in_executor(
+                get_training_executor(), prepare_and_train_models, data
+            )
+        except Exception as e:
+            print(f"Training job {job_id} failed: {e}")
+            traceback.print_exc()
+            job['status'] = 'failed'
+            job['error'] = str(e)
+            job['finished_at'] = datetime.now().isoformat()
+            return
+        
+        # Update application state in one step; nothing awaits in between, so
+        # requests see either the old models or the new ones, never a mix
+        app.state.data = data
+        app.state.processed_data = processed_data
+        app.state.feature_index = feature_index
+        app.state.insights_store = insights_store
+        app.state.team_index = team_index
+        app.state.head_to_head = head_to_head
+        app.state.model = model
+        app.state.ensemble_model = ensemble_model
+        
+        job['status'] = 'completed'
+        job['model_version'] = getattr(model, 'model_version', None)
+        job['ensemble_model_version'] = getattr(ensemble_model, 'model_version', None)
+        job['finished_at'] = datetime.now().isoformat()
+        print(f"Training job {job_id} completed")
+
+@app.get("/jobs/{job_id}")
+async def get_training_job(job_id: str):
+    """Return the status of a retraining job started by /upload-data/"""
+    job = app.state.training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@app.post("/upload-data/", status_code=202)
 async def upload_data(file: UploadFile = File(...)):
     print(f"File upload received: {file.filename}, content-type: {file.content_type}")
     
@@ -646,74 +1105,16 @@ async def upload_data(file: UploadFile = File(...)):
                 elif col == 'sot':
                     data[col] = 4.0   # Default shots on target
         
-        # Process data
-        try:
-            # Convert date to datetime explicitly
-            data['date'] = pd.to_datetime(data['date'], errors='coerce')
-            
-            # Handle any missing or invalid dates
-            if data['date'].isna().any():
-                print("Warning: Invalid dates detected, filling with today's date")
-                data['date'] = data['date'].fillna(pd.Timestamp.now())
-            
-            # Make sure venue is properly capitalized
-            if 'venue' in data.columns:
-                data['venue'] = data['venue'].str.capitalize()
-                # Make sure it's either 'Home' or 'Away'
-                valid_venues = ['Home', 'Away']
-                if not data['venue'].isin(valid_venues).all():
-                    print("Warning: Invalid venue values detected, correcting to 'Home'")
-                    data.loc[~data['venue'].isin(valid_venues), 'venue'] = 'Home'
-            
-            processed_data = prepare_model_data(data)
-            print("Data preprocessing successful")
-            
-        except Exception as process_error:
-            print(f"Error processing data: {process_error}")
-            import traceback
-            traceback.print_exc()
-            # Use a simpler processing approach
-            data['date'] = pd.to_datetime(data['date'], errors='coerce')
-            data['venue_code'] = data['venue'].map({'Home': 1, 'Away': 0}).fillna(1)
-            data['target'] = data['result'].map({'W': 1, 'D': 0, 'L': 0}).fillna(0)
-            processed_data = data
-            print("Used fallback data processing")
-        
-        # Train models - both regular and ensemble
-        try:
-            # Train regular model
-            model = train_prediction_model(processed_data)
-            print("Regular model training successful")
-            
-            # Train ensemble model
-            ensemble_model = train_ensemble_model(processed_data)
-            print("Ensemble model training successful")
-        except Exception as model_error:
-            print(f"Error training models: {model_error}")
-            import traceback
-            traceback.print_exc()
-            # Create default models
-            model = train_prediction_model(None)
-            ensemble_model = train_ensemble_model(None)
-            print("Used fallback model creation")
+        # Train in the background; the current models keep serving until the swap
+        job_id = submit_training_job(data, file.filename)
         
-        # Update application state
-        app.state.data = data
-        app.state.processed_data = processed_data
-        app.state.model = model
-        app.state.ensemble_model = ensemble_model
-        
-        # Ensure data directory exists
-        os.makedirs(os.path.dirname(DATA_PATH), exist_ok=True)
-        
-        # Save data to file
-        try:
-            data.to_csv(DATA_PATH, index=False)
-            print(f"Data saved to {DATA_PATH}")
-        except Exception as save_error:
-            print(f"Warning: Could not save data to file: {save_error}")
-        
-        return {"filename": file.filename, "rows": len(data), "columns": len(data.columns)}
+        return {
+            "filename": file.filename,
+            "rows": len(data),
+            "columns": len(data.columns),
+            "job_id": job_id,
+            "status": app.state.training_jobs[job_id]['status']
+        }
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
@@ -0,0 +1,119 @@
+# api/team_index.py
+import json
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Tuple
+
+
+def _encode_json_value(value):
+    """json.dumps fallback for the non-native values left in match records."""
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def serialize_json(payload) -> bytes:
+    """Serialize a payload the way the API's JSONResponse does."""
+    return json.dumps(
+        payload,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+        default=_encode_json_value
+    ).encode("utf-8")
+
+
+class TeamIndex:
+    """
+    Team-partitioned view of the match data for /team-stats/ and /teams/.
+
+    Matches are stored sorted by team (keeping their original order within a
+    team), so each team's matches are one contiguous row slice. W/D/L counts,
+    the sorted team list and the JSON body of every /team-stats/ response are
+    computed at build time.
+    """
+
+    def __init__(self, frame: Optional[pd.DataFrame] = None, slices: Optional[Dict[str, Tuple[int, int]]] = None,
+                 stats: Optional[Dict[str, Dict]] = None, team_stats_json: Optional[Dict[str, bytes]] = None):
+        """
+        Initialize the index.
+
+        Args:
+            frame: Match data sorted by team
+            slices: Mapping of team name to its (start, stop) rows in frame
+            stats: Mapping of team name to its summary stats
+            team_stats_json: Mapping of team name to the serialized /team-stats/ body
+        """
+        self.frame = frame if frame is not None else pd.DataFrame()
+        self.slices = slices or {}
+        self.stats = stats or {}
+        self.team_stats_json = team_stats_json or {}
+        self.teams = sorted(self.slices)
+        self.teams_json = serialize_json(self.teams)
+
+    @classmethod
+    def build(cls, data: Optional[pd.DataFrame]) -> 'TeamIndex':
+        """
+        Build the index from raw match data.
+
+        Args:
+            data: Match data (app.state.data); it is not modified
+
+        Returns:
+            A new TeamIndex (empty when there is no team data)
+        """
+        if data is None or data.empty or 'team' not in data.columns:
+            return cls()
+
+        # Stable sort keeps each team's matches in their original order
+        frame = data[data['team'].notna()]
+        frame = frame.iloc[np.argsort(frame['team'].to_numpy(dtype=str), kind='mergesort')].reset_index(drop=True)
+
+        team_values = frame['team'].to_numpy()
+        boundaries = np.flatnonzero(team_values[1:] != team_values[:-1]) + 1
+        starts = np.concatenate([[0], boundaries])
+        stops = np.concatenate([boundaries, [len(frame)]])
+        slices = {team_values[start]: (int(start), int(stop)) for start, stop in zip(starts, stops)}
+
+        # W/D/L counts per team in one pass
+        results = frame['result'] if 'result' in frame.columns else pd.Series(np.nan, index=frame.index)
+        result_counts = pd.crosstab(frame['team'], results).reindex(columns=['W', 'D', 'L'], fill_value=0)
+
+        # JSON can't hold NaN/NaT; send them as null
+        records = frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+        stats = {}
+        team_stats_json = {}
+        for team, (start, stop) in slices.items():
+            matches_played = stop - start
+            wins, draws, losses = (int(result_counts.at[team, result]) if team in result_counts.index else 0
+                                   for result in ('W', 'D', 'L'))
+            stats[team] = {
+                "matches_played": matches_played,
+                "wins": wins,
+                "draws": draws,
+                "losses": losses,
+                "win_percentage": round(wins / matches_played * 100, 1) if matches_played else 0
+            }
+            team_stats_json[team] = serialize_json({"matches": records[start:stop], "stats": stats[team]})
+
+        return cls(frame=frame, slices=slices, stats=stats, team_stats_json=team_stats_json)
+
+    def __contains__(self, team: str) -> bool:
+        return team in self.slices
+
+    def __len__(self):
+        return len(self.slices)
+
+    def get_matches(self, team: str) -> pd.DataFrame:
+        """Return a team's matches as a slice of the index frame (empty if unknown)."""
+        start, stop = self.slices.get(team, (0, 0))
+        return self.frame.iloc[start:stop]
+
+    def get_team_stats_json(self, team: str) -> Optional[bytes]:
+        """Return the serialized /team-stats/ body for a team, or None if unknown."""
+        return self.team_stats_json.get(team)
@@ -1,15 +1,151 @@
 # data_pipeline/processors/feature_generator.py
+import os
 import pandas as pd
 import numpy as np
+import pyarrow as pa
 import logging
+from concurrent.futures import ProcessPoolExecutor
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Team form stats: source column, output column prefix and rolling aggregate
+FORM_STATS = [
+    ('points', 'points', 'sum'),
+    ('goals_for', 'goals_for', 'sum'),
+    ('goals_against', 'goals_against', 'sum'),
+    ('is_win', 'win_rate', 'mean'),
+    ('clean_sheet', 'clean_sheets', 'sum'),
+    ('failed_to_score', 'failed_to_score', 'sum'),
+]
+
+# Binary weather conditions: name -> (column, comparison, threshold), giving
+# is_{name} flags and home/away_{name}_impact columns
+WEATHER_CONDITIONS = {
+    'rainy': ('precipitation_mm', '>', 1.0),
+    'windy': ('wind_kph', '>', 25.0),
+    'cold': ('temperature_c', '<', 5.0),
+    'hot': ('temperature_c', '>', 25.0),
+}
+
+WEATHER_COMPARISONS = {'>': np.greater, '>=': np.greater_equal, '<': np.less, '<=': np.less_equal}
+
+# Supported overround removal methods for bookmaker odds
+DEVIG_METHODS = ('power', 'shin')
+
+# Bisection steps for the devig solvers; each halves the bracket
+DEVIG_ITERATIONS = 60
+
+
+def devig_probabilities(odds, method='power'):
+    """
+    Convert decimal odds into overround-free outcome probabilities.
+    
+    Every row (one bookmaker's prices for one match) is solved at once by
+    bisection over the whole matrix.
+    
+    power: p_i = (1 / o_i) ** k, with k chosen so the p_i sum to 1.
+    shin: p_i = (sqrt(z**2 + 4 * (1 - z) * q_i**2 / Q) - z) / (2 * (1 - z)),
+        where q_i = 1 / o_i and Q = sum(q_i), with the insider share z chosen
+        so the p_i sum to 1. Books without a margin are just normalized.
+    
+    Args:
+        odds: Array of shape (n_rows, n_outcomes) of decimal odds
+        method: One of DEVIG_METHODS
+    
+    Returns:
+        Array of probabilities shaped like odds; NaN for rows with missing
+        odds or odds of 1.0 or less
+    """
+    if method not in DEVIG_METHODS:
+        raise ValueError(f"Unknown devig method: {method}")
+    
+    implied = 1.0 / np.asarray(odds, dtype=float)
+    valid = np.isfinite(implied).all(axis=1) & (implied < 1.0).all(axis=1) & (implied > 0.0).all(axis=1)
+    implied = np.where(valid[:, None], implied, 0.5)
+    booksum = implied.sum(axis=1, keepdims=True)
+    
+    if method == 'power':
+        def solve(k):
+            return implied ** k
+        
+        # sum(q_i ** k) falls from n_outcomes at k=0 to below 1 at hi
+        lo = np.zeros((len(implied), 1))
+        hi = np.log(1.0 / implied.shape[1]) / np.log(implied.max(axis=1, keepdims=True)) + 1.0
+    else:
+        def solve(z):
+            return (np.sqrt(z ** 2 + 4 * (1 - z) * implied ** 2 / booksum) - z) / (2 * (1 - z))
+        
+        # sum(p_i) is sqrt(Q) > 1 at z=0 and tends to sum(q_i**2) / Q < 1 as z -> 1
+        lo = np.zeros((len(implied), 1))
+        hi = np.full((len(implied), 1), 1.0 - 1e-12)
+    
+    for _ in range(DEVIG_ITERATIONS):
+        mid = (lo + hi) / 2
+        too_high = solve(mid).sum(axis=1, keepdims=True) > 1.0
+        lo = np.where(too_high, mid, lo)
+        hi = np.where(too_high, hi, mid)
+    
+    probabilities = solve((lo + hi) / 2)
+    probabilities = probabilities / probabilities.sum(axis=1, keepdims=True)
+    if method == 'shin':
+        probabilities = np.where(booksum > 1.0, probabilities, implied / booksum)
+    return np.where(valid[:, None], probabilities, np.nan)
+
+
 class FeatureGenerator:
-    def __init__(self):
-        self.window_sizes = [3, 5, 10]
+    def __init__(self, h2h_as_of_date=False, window_sizes=(3, 5, 10), ewm_spans=(), density_windows=(30,),
+                 rest_day_bins=(0, 3, 6, float('inf')), rest_day_labels=('short', 'medium', 'long'),
+                 quick_turnaround_days=4, devig_method=None, weather_conditions=None, weather_bins=None,
+                 n_jobs=1):
+        """
+        Args:
+            h2h_as_of_date: Compute head-to-head features from meetings before
+                each match only, instead of over the whole dataset
+            window_sizes: Match windows for the rolling *_last_{n} form columns
+            ewm_spans: Spans for exponentially weighted *_ewm_{span} form columns
+            density_windows: Day windows for the match_density_{n}d columns
+            rest_day_bins: pd.cut bin edges for days since the previous match
+            rest_day_labels: Bucket names, giving points_{label}_rest columns
+            quick_turnaround_days: Rest below this many days flags quick_turnaround
+            devig_method: Also add margin-free implied_*_prob_{method} columns
+                using one of DEVIG_METHODS ('power' or 'shin')
+            weather_conditions: Binary conditions in the WEATHER_CONDITIONS format
+                (defaults to WEATHER_CONDITIONS)
+            weather_bins: Continuous weather buckets, name -> (column, bins, labels);
+                each bucket is added as an {name}_{label} condition, e.g.
+                {'temperature': ('temperature_c', [-np.inf, 5, 15, 25, np.inf],
+                ['cold', 'mild', 'warm', 'hot'])}
+            n_jobs: Worker processes for generate_features, sharded by team
+                (-1 for all cores; 1 runs in-process)
+        """
+        self.window_sizes = list(window_sizes)
+        self.ewm_spans = list(ewm_spans)
         self.standard_team_names = None  # Will load from database
+        self.h2h_as_of_date = h2h_as_of_date
+        self.density_windows = list(density_windows)
+        self.rest_day_bins = list(rest_day_bins)
+        self.rest_day_labels = list(rest_day_labels)
+        self.quick_turnaround_days = quick_turnaround_days
+        self.devig_method = devig_method
+        self.weather_conditions = dict(weather_conditions or WEATHER_CONDITIONS)
+        self.weather_bins = dict(weather_bins or {})
+        self.n_jobs = n_jobs
+    
+    def get_config(self):
+        """Return the settings that determine the generated features."""
+        return {
+            'window_sizes': self.window_sizes,
+            'ewm_spans': self.ewm_spans,
+            'h2h_as_of_date': self.h2h_as_of_date,
+            'density_windows': self.density_windows,
+            'rest_day_bins': self.rest_day_bins,
+            'rest_day_labels': self.rest_day_labels,
+            'quick_turnaround_days': self.quick_turnaround_days,
+            'devig_method': self.devig_method,
+            'weather_conditions': self.weather_conditions,
+            'weather_bins': self.weather_bins
+        }
     
     def generate_features(self, df):
         """
@@ -49,6 +185,26 @@ class FeatureGenerator:
         features['failed_to_score'] = (features['goals_for'] == 0).astype(int)
         features['points'] = features['result'].map({'W': 3, 'D': 1, 'L': 0})
         
+        n_jobs = (os.cpu_count() or 1) if self.n_jobs == -1 else self.n_jobs
+        if n_jobs > 1:
+            features = self._generate_features_parallel(features, n_jobs)
+        else:
+            features = self._add_feature_steps(features)
+        
+        logger.info(f"Generated {len(features.columns) - len(df.columns)} new features")
+        return features
+    
+    def _add_feature_steps(self, features, known_teams=None, rest_fill=None):
+        """
+        Run every feature step on flagged, team/date-sorted match data.
+        
+        Args:
+            features: Match data with the binary flags and points
+            known_teams: Teams that can have a head-to-head record (defaults to
+                the teams in features)
+            rest_fill: Fill value for missing rest-day performance (defaults to
+                the mean over features)
+        """
         # Generate team form features
         features = self._add_team_form_features(features)
         
@@ -56,7 +212,7 @@ class FeatureGenerator:
         features = self._add_venue_features(features)
         
         # Add head-to-head features if data available
-        features = self._add_head_to_head_features(features)
+        features = self._add_head_to_head_features(features, known_teams)
         
         # Add betting odds features if available
         if {'home_win_odds', 'draw_odds', 'away_win_odds'}.issubset(features.columns):
@@ -67,48 +223,97 @@ class FeatureGenerator:
             features = self._add_weather_features(features)
         
         # Add fixture congestion features
-        features = self._add_schedule_features(features)
+        features = self._add_schedule_features(features, rest_fill)
         
-        logger.info(f"Generated {len(features.columns) - len(df.columns)} new features")
+        return features
+    
+    def _generate_features_parallel(self, features, n_jobs):
+        """
+        Run the feature steps on team shards in a process pool.
+        
+        Every step only looks at a team's own rows, except for the set of
+        teams (head-to-head) and the rest-day fill value (schedule), which are
+        computed here over all data and passed to each shard. Shards are
+        contiguous team ranges of features, sent to and from the workers as
+        Arrow IPC streams and concatenated in order, so the output matches a
+        single-process run.
+        """
+        known_teams = features['team'].dropna().unique()
+        days_since_last_match = (features['date'] - features.groupby('team')['date'].shift(1)).dt.days
+        rest_fill = self._rest_performance(features, days_since_last_match).mean()
+        
+        # Cut at team boundaries into about 4 shards per worker, balanced by rows
+        team_values = features['team'].to_numpy()
+        boundaries = np.flatnonzero(team_values[1:] != team_values[:-1]) + 1
+        n_shards = min(n_jobs * 4, len(boundaries) + 1)
+        targets = np.linspace(0, len(features), n_shards + 1)[1:-1]
+        cuts = np.unique(boundaries[np.searchsorted(boundaries, targets).clip(max=len(boundaries) - 1)]) if len(boundaries) else []
+        starts = np.concatenate([[0], cuts]).astype(int)
+        stops = np.concatenate([cuts, [len(features)]]).astype(int)
+        
+        logger.info(f"Generating features for {len(starts)} team shards with {n_jobs} workers")
+        config = self.get_config()
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(starts))) as executor:
+            futures = [
+                executor.submit(_generate_shard, config, _to_ipc(features.iloc[start:stop]), known_teams, rest_fill)
+                for start, stop in zip(starts, stops)
+            ]
+            results = [future.result() for future in futures]
+        
+        # The head-to-head merge renumbers rows 0..n-1; renumber across shards the same way
+        features = pd.concat([_from_ipc(buffer) for buffer, _ in results])
+        if not all(index_kept for _, index_kept in results):
+            features = features.reset_index(drop=True)
         return features
     
     def _add_team_form_features(self, df):
         """Add rolling window statistics for team form"""
         logger.info("Adding team form features")
         
-        for window in self.window_sizes:
-            # Points in last N matches
-            df[f'points_last_{window}'] = df.groupby('team')['points'].transform(
-                lambda x: x.rolling(window, min_periods=1).sum()
-            )
-            
-            # Goals scored in last N matches
-            df[f'goals_for_last_{window}'] = df.groupby('team')['goals_for'].transform(
-                lambda x: x.rolling(window, min_periods=1).sum()
-            )
-            
-            # Goals conceded in last N matches
-            df[f'goals_against_last_{window}'] = df.groupby('team')['goals_against'].transform(
-                lambda x: x.rolling(window, min_periods=1).sum()
-            )
+        # Group once: order rows team by team (stable, so each team keeps its
+        # match order) and take every window from per-team cumulative sums
+        team_codes = df.groupby('team', sort=False).ngroup().to_numpy()
+        order = np.argsort(team_codes, kind='mergesort')
+        sorted_codes = team_codes[order]
+        positions = np.arange(len(df))
+        new_team = np.ones(len(df), dtype=bool)
+        new_team[1:] = sorted_codes[1:] != sorted_codes[:-1]
+        team_starts = np.maximum.accumulate(np.where(new_team, positions, 0))
+        
+        form = {}
+        for column, prefix, aggregate in FORM_STATS:
+            values = df[column].to_numpy(dtype=float)[order]
+            present = ~np.isnan(values)
+            value_sums = np.concatenate([[0.0], np.cumsum(np.where(present, values, 0.0))])
+            value_counts = np.concatenate([[0], np.cumsum(present)])
             
-            # Win rate in last N matches
-            df[f'win_rate_last_{window}'] = df.groupby('team')['is_win'].transform(
-                lambda x: x.rolling(window, min_periods=1).mean()
-            )
-            
-            # Goal difference in last N matches
-            df[f'goal_diff_last_{window}'] = df[f'goals_for_last_{window}'] - df[f'goals_against_last_{window}']
-            
-            # Clean sheets in last N matches
-            df[f'clean_sheets_last_{window}'] = df.groupby('team')['clean_sheet'].transform(
-                lambda x: x.rolling(window, min_periods=1).sum()
-            )
-            
-            # Failed to score in last N matches
-            df[f'failed_to_score_last_{window}'] = df.groupby('team')['failed_to_score'].transform(
-                lambda x: x.rolling(window, min_periods=1).sum()
-            )
+            for window in self.window_sizes:
+                window_starts = np.maximum(positions - window + 1, team_starts)
+                sums = value_sums[positions + 1] - value_sums[window_starts]
+                counts = value_counts[positions + 1] - value_counts[window_starts]
+                
+                # Like rolling(window, min_periods=1): NaN once a window has no values
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    result = sums / counts if aggregate == 'mean' else sums
+                result = np.where((counts > 0) & (sorted_codes >= 0), result, np.nan)
+                form[f'{prefix}_last_{window}'] = self._unsort(result, order)
+        
+        for window in self.window_sizes:
+            for column, prefix, _ in FORM_STATS:
+                df[f'{prefix}_last_{window}'] = form[f'{prefix}_last_{window}']
+                
+                # Goal difference in last N matches
+                if prefix == 'win_rate':
+                    df[f'goal_diff_last_{window}'] = df[f'goals_for_last_{window}'] - df[f'goals_against_last_{window}']
+        
+        # Exponentially weighted form, weighting recent matches more
+        if self.ewm_spans:
+            stats = df[[column for column, _, _ in FORM_STATS]].iloc[order].reset_index(drop=True).astype(float)
+            grouped = stats.groupby(pd.Series(sorted_codes).where(sorted_codes >= 0), sort=False)
+            for span in self.ewm_spans:
+                ewm = grouped.ewm(span=span, min_periods=1).mean().droplevel(0).reindex(stats.index)
+                for column, prefix, _ in FORM_STATS:
+                    df[f'{prefix}_ewm_{span}'] = self._unsort(ewm[column].to_numpy(), order)
         
         # Calculate momentum (trend in recent performance)
         if len(self.window_sizes) >= 2:
@@ -120,6 +325,13 @@ class FeatureGenerator:
         
         return df
     
+    @staticmethod
+    def _unsort(values, order):
+        """Return values computed on rows taken in `order` in the original row order."""
+        unsorted = np.empty_like(values)
+        unsorted[order] = values
+        return unsorted
+    
     def _add_venue_features(self, df):
         """Add home/away specific performance metrics"""
         logger.info("Adding venue-specific features")
@@ -161,58 +373,59 @@ class FeatureGenerator:
         
         return result
     
-    def _add_head_to_head_features(self, df):
+    def _add_head_to_head_features(self, df, known_teams=None):
         """Add head-to-head statistics between teams"""
         logger.info("Adding head-to-head features")
         
-        # Group by team pairs and compute statistics
-        h2h_results = []
-        
-        teams = df['team'].unique()
-        for team in teams:
-            for opponent in teams:
-                if team != opponent:
-                    # Get matches between these teams
-                    team_matches = df[(df['team'] == team) & (df['opponent'] == opponent)]
-                    
-                    if len(team_matches) > 0:
-                        # Calculate h2h stats
-                        h2h_stats = {
-                            'team': team,
-                            'opponent': opponent,
-                            'h2h_matches': len(team_matches),
-                            'h2h_wins': sum(team_matches['result'] == 'W'),
-                            'h2h_draws': sum(team_matches['result'] == 'D'),
-                            'h2h_losses': sum(team_matches['result'] == 'L'),
-                            'h2h_goals_for': team_matches['goals_for'].sum(),
-                            'h2h_goals_against': team_matches['goals_against'].sum()
-                        }
-                        
-                        # Calculate derived metrics
-                        if h2h_stats['h2h_matches'] > 0:
-                            h2h_stats['h2h_win_rate'] = h2h_stats['h2h_wins'] / h2h_stats['h2h_matches']
-                            h2h_stats['h2h_points_per_game'] = (h2h_stats['h2h_wins'] * 3 + h2h_stats['h2h_draws']) / h2h_stats['h2h_matches']
-                            h2h_stats['h2h_avg_goals_for'] = h2h_stats['h2h_goals_for'] / h2h_stats['h2h_matches']
-                            h2h_stats['h2h_avg_goals_against'] = h2h_stats['h2h_goals_against'] / h2h_stats['h2h_matches']
-                        
-                        h2h_results.append(h2h_stats)
-        
-        if h2h_results:
-            h2h_df = pd.DataFrame(h2h_results)
+        # Only opponents that also appear as teams have a head-to-head record
+        if known_teams is None:
+            known_teams = df['team'].dropna().unique()
+        pair_mask = df['opponent'].isin(known_teams) & (df['team'] != df['opponent'])
+        if not pair_mask.any():
+            return df
+        
+        pairs = df.loc[pair_mask, ['team', 'opponent', 'date', 'goals_for', 'goals_against']].assign(
+            h2h_wins=(df.loc[pair_mask, 'result'] == 'W').astype(int),
+            h2h_draws=(df.loc[pair_mask, 'result'] == 'D').astype(int),
+            h2h_losses=(df.loc[pair_mask, 'result'] == 'L').astype(int)
+        ).rename(columns={'goals_for': 'h2h_goals_for', 'goals_against': 'h2h_goals_against'})
+        count_cols = ['h2h_wins', 'h2h_draws', 'h2h_losses', 'h2h_goals_for', 'h2h_goals_against']
+        
+        if self.h2h_as_of_date:
+            # Leakage-free: each row only sees the pair's earlier meetings
+            pairs = pairs.sort_values(['team', 'opponent', 'date'], kind='mergesort')
+            pairs[count_cols] = pairs[count_cols].fillna(0)
+            pair_keys = [pairs['team'], pairs['opponent']]
+            totals = pairs.groupby(pair_keys, sort=False)[count_cols].cumsum()
+            h2h_df = totals.groupby(pair_keys, sort=False).shift(1, fill_value=0)
+            h2h_df.insert(0, 'h2h_matches', pairs.groupby(pair_keys, sort=False).cumcount())
+            h2h_df = self._add_head_to_head_rates(h2h_df.reindex(df.index))
+            result = df.join(h2h_df)
+        else:
+            # One aggregation over all (team, opponent) pairs
+            h2h_df = pairs.groupby(['team', 'opponent'])[count_cols].sum()
+            h2h_df.insert(0, 'h2h_matches', pairs.groupby(['team', 'opponent']).size())
+            h2h_df = self._add_head_to_head_rates(h2h_df).reset_index()
             result = df.merge(h2h_df, on=['team', 'opponent'], how='left')
-            
-            # Fill NAs with sensible defaults
-            for col in [c for c in result.columns if c.startswith('h2h_')]:
-                if col.endswith('_rate') or col.endswith('_per_game'):
-                    result[col] = result[col].fillna(0.5)  # Neutral expectation
-                elif col.endswith('_matches'):
-                    result[col] = result[col].fillna(0)
-                else:
-                    result[col] = result[col].fillna(0)
-                    
-            return result
         
-        return df
+        # Fill NAs with sensible defaults
+        for col in [c for c in result.columns if c.startswith('h2h_')]:
+            if col.endswith('_rate') or col.endswith('_per_game'):
+                result[col] = result[col].fillna(0.5)  # Neutral expectation
+            else:
+                result[col] = result[col].fillna(0)
+        
+        return result
+    
+    @staticmethod
+    def _add_head_to_head_rates(h2h_df):
+        """Add per-match head-to-head rates from the h2h count columns"""
+        matches = h2h_df['h2h_matches'].where(h2h_df['h2h_matches'] > 0)
+        h2h_df['h2h_win_rate'] = h2h_df['h2h_wins'] / matches
+        h2h_df['h2h_points_per_game'] = (h2h_df['h2h_wins'] * 3 + h2h_df['h2h_draws']) / matches
+        h2h_df['h2h_avg_goals_for'] = h2h_df['h2h_goals_for'] / matches
+        h2h_df['h2h_avg_goals_against'] = h2h_df['h2h_goals_against'] / matches
+        return h2h_df
     
     def _add_odds_features(self, df):
         """Add betting market derived features"""
@@ -231,20 +444,28 @@ class FeatureGenerator:
             df[f"{col}_normalized"] = df[col] / df['total_implied_prob']
         
         # Add market-derived features
-        df['market_expected_goals'] = df.apply(
-            lambda row: 1.5 * row['implied_home_win_prob_normalized'] + 
-                        0.9 * row['implied_draw_prob_normalized'] + 
-                        0.6 * row['implied_away_win_prob_normalized'],
-            axis=1
+        df['market_expected_goals'] = (
+            1.5 * df['implied_home_win_prob_normalized'] +
+            0.9 * df['implied_draw_prob_normalized'] +
+            0.6 * df['implied_away_win_prob_normalized']
         )
         
         # Add surprise factors (actual vs expected)
-        df['win_surprise'] = df['is_win'] - df.apply(
-            lambda row: row['implied_home_win_prob_normalized'] if row['venue'] == 'Home' 
-                        else row['implied_away_win_prob_normalized'],
-            axis=1
+        df['win_surprise'] = df['is_win'] - np.where(
+            df['venue'] == 'Home',
+            df['implied_home_win_prob_normalized'],
+            df['implied_away_win_prob_normalized']
         )
         
+        # Margin-free probabilities for every row (one per bookmaker when not aggregated)
+        if self.devig_method:
+            probabilities = devig_probabilities(
+                df[['home_win_odds', 'draw_odds', 'away_win_odds']].to_numpy(dtype=float),
+                method=self.devig_method
+            )
+            for i, outcome in enumerate(['home_win', 'draw', 'away_win']):
+                df[f'implied_{outcome}_prob_{self.devig_method}'] = probabilities[:, i]
+        
         return df
     
     def _add_weather_features(self, df):
@@ -252,37 +473,86 @@ class FeatureGenerator:
         logger.info("Adding weather impact features")
         
         # Create weather condition categories
-        df['is_rainy'] = df['precipitation_mm'] > 1.0
-        df['is_windy'] = df['wind_kph'] > 25.0
-        df['is_cold'] = df['temperature_c'] < 5.0
-        df['is_hot'] = df['temperature_c'] > 25.0
-        
-        # Calculate team performance in different weather conditions
-        for condition in ['is_rainy', 'is_windy', 'is_cold', 'is_hot']:
-            # Home performance in this condition
-            home_perf = df[df['venue'] == 'Home'].groupby(['team', condition])['points'].mean().unstack()
-            home_perf.columns = [f'home_points_normal', f'home_points_{condition[3:]}']
-            
-            # Away performance in this condition
-            away_perf = df[df['venue'] == 'Away'].groupby(['team', condition])['points'].mean().unstack()
-            away_perf.columns = [f'away_points_normal', f'away_points_{condition[3:]}']
-            
-            # Combine and calculate weather impact
-            weather_impact = pd.DataFrame(index=df['team'].unique())
-            
-            if not home_perf.empty and set(['home_points_normal', f'home_points_{condition[3:]}']).issubset(home_perf.columns):
-                weather_impact[f'home_{condition[3:]}_impact'] = home_perf[f'home_points_{condition[3:]}'] - home_perf['home_points_normal']
-                
-            if not away_perf.empty and set(['away_points_normal', f'away_points_{condition[3:]}']).issubset(away_perf.columns):
-                weather_impact[f'away_{condition[3:]}_impact'] = away_perf[f'away_points_{condition[3:]}'] - away_perf['away_points_normal']
-            
-            # Merge weather impact features
-            if not weather_impact.empty:
-                df = df.merge(weather_impact, left_on='team', right_index=True, how='left')
+        conditions = []
+        for name, (column, comparison, threshold) in self.weather_conditions.items():
+            df[f'is_{name}'] = WEATHER_COMPARISONS[comparison](df[column], threshold)
+            conditions.append(name)
+        
+        for name, (column, bins, labels) in self.weather_bins.items():
+            buckets = pd.cut(df[column], bins=bins, labels=labels)
+            for label in labels:
+                df[f'is_{name}_{label}'] = buckets == label
+                conditions.append(f'{name}_{label}')
+        
+        if not conditions:
+            return df
+        
+        # Team performance in and out of each condition, per venue, from one
+        # grouped sum over (team, venue, condition, flag) keys
+        team_codes, teams = pd.factorize(df['team'])
+        venue_codes = np.select([df['venue'] == 'Home', df['venue'] == 'Away'], [0, 1], default=-1)
+        flags = np.column_stack([df[f'is_{name}'].to_numpy(dtype=bool) for name in conditions])
+        points = df['points'].to_numpy(dtype=float)
+        
+        rows = (team_codes >= 0) & (venue_codes >= 0) & ~np.isnan(points)
+        n_conditions = len(conditions)
+        keys = ((team_codes[rows] * 2 + venue_codes[rows])[:, None] * n_conditions + np.arange(n_conditions)) * 2 + flags[rows]
+        n_keys = len(teams) * 2 * n_conditions * 2
+        points_sum = np.bincount(keys.ravel(), weights=np.repeat(points[rows], n_conditions), minlength=n_keys)
+        matches = np.bincount(keys.ravel(), minlength=n_keys)
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            points_mean = (points_sum / matches).reshape(len(teams), 2, n_conditions, 2)
+        impact = points_mean[..., 1] - points_mean[..., 0]
+        
+        # Merge all weather impact features at once
+        weather_impact = pd.DataFrame({
+            f'{venue}_{name}_impact': impact[:, v, c]
+            for c, name in enumerate(conditions)
+            for v, venue in enumerate(['home', 'away'])
+        }, index=teams)
+        df = df.merge(weather_impact, left_on='team', right_index=True, how='left')
         
         return df
     
-    def _add_schedule_features(self, df):
+    @staticmethod
+    def _count_recent_matches(df, n_days):
+        """
+        Count each team's earlier matches at most n_days before every match.
+        
+        Expects df sorted by team then date. An earlier match counts when
+        (date - earlier_date).days <= n_days, i.e. it is less than n_days + 1
+        days back, so each row's count is its position within the team minus
+        a binary search for the window start: O(n log n) overall.
+        """
+        counts = np.full(len(df), np.nan)
+        teams = df['team'].to_numpy()
+        dates = df['date'].to_numpy(dtype='datetime64[ns]')
+        window = np.timedelta64(n_days + 1, 'D')
+        
+        team_rows = df.reset_index(drop=True).groupby('team', sort=False).indices
+        for rows in team_rows.values():
+            start, stop = rows[0], rows[-1] + 1
+            team_dates = dates[start:stop]
+            
+            # Missing dates sort last and never count or get counted
+            valid = int((~np.isnat(team_dates)).sum())
+            team_counts = np.zeros(stop - start)
+            team_dates = team_dates[:valid]
+            window_starts = np.searchsorted(team_dates, team_dates - window, side='right')
+            team_counts[:valid] = np.arange(valid) - window_starts
+            counts[start:stop] = team_counts
+        
+        if not np.isnan(counts).any():
+            counts = counts.astype(np.int64)
+        return pd.Series(counts, index=df.index)
+    
+    def _rest_performance(self, df, days_since_last_match):
+        """Mean points per team and rest-day bucket"""
+        rest_buckets = pd.cut(days_since_last_match, bins=self.rest_day_bins, labels=self.rest_day_labels)
+        return df.groupby(['team', rest_buckets])['points'].mean()
+    
+    def _add_schedule_features(self, df, rest_fill=None):
         """Add features related to fixture congestion and rest days"""
         logger.info("Adding schedule-related features")
         
@@ -293,26 +563,47 @@ class FeatureGenerator:
         df['prev_match_date'] = df.groupby('team')['date'].shift(1)
         df['days_since_last_match'] = (df['date'] - df['prev_match_date']).dt.days
         
-        # Calculate match density (matches in last 30 days)
-        def count_matches_in_last_n_days(dates, current_idx, n_days=30):
-            current_date = dates.iloc[current_idx]
-            prior_dates = dates.iloc[:current_idx]
-            return sum((current_date - prior_dates).dt.days <= n_days)
+        # Match density: earlier matches within each window, per team
+        for n_days in self.density_windows:
+            df[f'match_density_{n_days}d'] = self._count_recent_matches(df, n_days)
         
-        df['match_density_30d'] = df.groupby('team')['date'].transform(
-            lambda dates: [count_matches_in_last_n_days(dates, i) for i in range(len(dates))]
-        )
-        
-        # Flag for quick turnaround (less than 4 days since last match)
-        df['quick_turnaround'] = (df['days_since_last_match'] < 4) & (df['days_since_last_match'].notna())
+        # Flag for quick turnaround (short rest since last match)
+        df['quick_turnaround'] = (df['days_since_last_match'] < self.quick_turnaround_days) & (df['days_since_last_match'].notna())
         
         # Historical performance based on rest days
-        rest_perf = df.groupby(['team', pd.cut(df['days_since_last_match'], bins=[0, 3, 6, float('inf')], labels=['short', 'medium', 'long'])])['points'].mean()
+        rest_perf = self._rest_performance(df, df['days_since_last_match'])
         if not rest_perf.empty:
-            rest_perf = rest_perf.unstack().fillna(rest_perf.mean())
-            rest_perf.columns = ['points_short_rest', 'points_medium_rest', 'points_long_rest']
+            rest_perf = rest_perf.unstack().fillna(rest_perf.mean() if rest_fill is None else rest_fill)
+            rest_perf.columns = [f'points_{label}_rest' for label in rest_perf.columns]
             
             # Merge rest performance
             df = df.merge(rest_perf, left_on='team', right_index=True, how='left')
         
-        return df
\ No newline at end of file
+        return df
+
+
+def _to_ipc(df):
+    """Serialize a DataFrame, index included, as an Arrow IPC stream."""
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def _from_ipc(buffer):
+    """Read a DataFrame back from an Arrow IPC stream."""
+    return pa.ipc.open_stream(buffer).read_all().to_pandas()
+
+
+def _generate_shard(config, buffer, known_teams, rest_fill):
+    """
+    Process pool entry point: run the feature steps on one team shard.
+    
+    Returns:
+        (Arrow IPC stream of the features, whether the shard's index was kept)
+    """
+    generator = FeatureGenerator(**config)
+    shard = _from_ipc(buffer)
+    features = generator._add_feature_steps(shard, known_teams, rest_fill)
+    return _to_ipc(features), features.index.equals(shard.index)
@@ -0,0 +1,366 @@
+# data_pipeline/processors/feature_store.py
+import os
+import json
+import shutil
+import hashlib
+import logging
+from datetime import datetime
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from data_pipeline.processors.feature_generator import FeatureGenerator
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bump when feature code changes in a way the generator config doesn't capture
+FEATURE_SCHEMA_VERSION = 1
+
+MANIFEST_FILE = '_manifest.json'
+PARTITION_FILE = 'part-0.parquet'
+
+# Bump when the on-disk layout or manifest format changes; older stores are rebuilt
+MANIFEST_VERSION = 2
+
+# Directory name used for rows without a season/league (same as Hive)
+MISSING_PARTITION_VALUE = '__HIVE_DEFAULT_PARTITION__'
+
+FILTER_OPERATORS = {
+    '=': lambda value, target: value == target,
+    '==': lambda value, target: value == target,
+    '!=': lambda value, target: value != target,
+    '<': lambda value, target: value < target,
+    '<=': lambda value, target: value <= target,
+    '>': lambda value, target: value > target,
+    '>=': lambda value, target: value >= target,
+    'in': lambda value, target: value in target,
+    'not in': lambda value, target: value not in target,
+}
+
+
+def to_manifest_value(value):
+    """Return a partition value as a JSON-serializable scalar, None when missing."""
+    if pd.isna(value):
+        return None
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def coerce_filter_target(value, target):
+    """Convert a filter target to the type of a stored partition value, e.g. '2023' for season 2023."""
+    if value is None or isinstance(target, type(value)):
+        return target
+    if isinstance(value, str):
+        return str(target)
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and isinstance(target, str):
+        try:
+            return type(value)(target)
+        except ValueError:
+            return target
+    return target
+
+
+def hash_frame(df):
+    """Content hash of a DataFrame's columns, dtypes and values."""
+    digest = hashlib.sha1()
+    digest.update(json.dumps([[str(col), str(dtype)] for col, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def hash_config(config):
+    """Stable hash of a FeatureGenerator config."""
+    payload = json.dumps({'schema_version': FEATURE_SCHEMA_VERSION, 'config': config}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class FeatureStore:
+    """
+    Parquet store for FeatureGenerator output, partitioned by season and league.
+
+    Each partition is one file at <root>/season=<s>/league=<l>/part-0.parquet,
+    generated from that partition's raw matches only (so rolling features start
+    fresh each season). Directory names hold the URL-encoded partition values;
+    the manifest keeps the original values and dtypes, the generator config
+    hash and the input hash behind every partition, and build() only
+    regenerates partitions whose input or config changed. Partition key
+    columns are kept out of the files and added back on read.
+    """
+
+    def __init__(self, root='data/features', partition_cols=('season', 'league')):
+        """
+        Args:
+            root: Directory holding the partitions and the manifest
+            partition_cols: Raw data columns to partition on
+        """
+        self.root = root
+        self.partition_cols = list(partition_cols)
+        self.manifest_path = os.path.join(root, MANIFEST_FILE)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        empty_manifest = {'version': MANIFEST_VERSION, 'partition_cols': self.partition_cols, 'partitions': {}}
+        if not os.path.exists(self.manifest_path):
+            return empty_manifest
+
+        with open(self.manifest_path) as f:
+            manifest = json.load(f)
+
+        if manifest.get('partition_cols') != self.partition_cols:
+            raise ValueError(
+                f"Feature store at {self.root} is partitioned by {manifest.get('partition_cols')}, "
+                f"not {self.partition_cols}"
+            )
+        if manifest.get('version') != MANIFEST_VERSION:
+            logger.warning(f"Feature store at {self.root} uses an old layout, all partitions will be rebuilt")
+            return empty_manifest
+        return manifest
+
+    def _save_manifest(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _partition_keys(self, df):
+        """Return the partition values of every row, None where a column is missing."""
+        keys = pd.DataFrame(index=df.index)
+        for col in self.partition_cols:
+            keys[col] = df[col] if col in df.columns else None
+        return keys
+
+    def _partition_path(self, values):
+        """Directory of a partition, with each value URL-encoded into a single path segment."""
+        segments = []
+        for col, value in zip(self.partition_cols, values):
+            segment = MISSING_PARTITION_VALUE if value is None else quote(str(value), safe='')
+            segments.append(f"{col}={segment}")
+        return os.path.join(*segments)
+
+    def build(self, raw_data, generator=None, force=False):
+        """
+        Generate and persist features for every partition that is out of date.
+
+        raw_data is the full history: partitions with no rows in it are
+        removed from the store.
+
+        Args:
+            raw_data: Raw match data, as passed to FeatureGenerator.generate_features
+            generator: FeatureGenerator to use (defaults to FeatureGenerator())
+            force: Regenerate every partition even if the manifest says it is current
+
+        Returns:
+            Dict with the 'written', 'skipped' and 'removed' partition paths
+        """
+        generator = generator or FeatureGenerator()
+        config = generator.get_config()
+        config_hash = hash_config(config)
+        dtypes = {
+            col: str(raw_data[col].dtype) if col in raw_data.columns else 'object'
+            for col in self.partition_cols
+        }
+
+        summary = {'written': [], 'skipped': [], 'removed': []}
+        keys = self._partition_keys(raw_data)
+        groups = keys.groupby(self.partition_cols, sort=False, dropna=False).groups if not raw_data.empty else {}
+
+        current_paths = set()
+        for values, rows in groups.items():
+            values = values if isinstance(values, tuple) else (values,)
+            values = tuple(to_manifest_value(value) for value in values)
+            path = self._partition_path(values)
+            current_paths.add(path)
+            partition_data = raw_data.loc[rows]
+            input_hash = hash_frame(partition_data)
+
+            entry = self.manifest['partitions'].get(path)
+            if (not force and entry is not None and entry['config_hash'] == config_hash
+                    and entry['input_hash'] == input_hash):
+                summary['skipped'].append(path)
+                continue
+
+            logger.info(f"Generating features for partition {path} ({len(partition_data)} matches)")
+            features = generator.generate_features(partition_data)
+            features = features.drop(columns=[col for col in self.partition_cols if col in features.columns])
+
+            partition_dir = os.path.join(self.root, path)
+            os.makedirs(partition_dir, exist_ok=True)
+            file_path = os.path.join(partition_dir, PARTITION_FILE)
+            tmp_path = f"{file_path}.tmp"
+            pq.write_table(pa.Table.from_pandas(features, preserve_index=False), tmp_path)
+            os.replace(tmp_path, file_path)
+
+            self.manifest['partitions'][path] = {
+                'values': dict(zip(self.partition_cols, values)),
+                'dtypes': dtypes,
+                'config_hash': config_hash,
+                'config': config,
+                'input_hash': input_hash,
+                'rows': len(features),
+                'columns': [str(col) for col in features.columns],
+                'generated_at': datetime.now().isoformat()
+            }
+            self._save_manifest()
+            summary['written'].append(path)
+
+        summary['removed'] = self._remove_stale_partitions(current_paths)
+
+        logger.info(f"Feature store updated: {len(summary['written'])} partitions written, "
+                    f"{len(summary['skipped'])} unchanged, {len(summary['removed'])} removed")
+        return summary
+
+    def _remove_stale_partitions(self, current_paths):
+        """
+        Drop partitions whose season/league is no longer in the input.
+
+        Also deletes partition directories the manifest doesn't know about,
+        e.g. from an older layout or an interrupted build.
+
+        Returns:
+            Sorted list of the removed partition paths
+        """
+        removed = sorted(path for path in self.manifest['partitions'] if path not in current_paths)
+        for path in removed:
+            del self.manifest['partitions'][path]
+        if removed:
+            self._save_manifest()
+
+        if os.path.isdir(self.root):
+            for entry in os.listdir(self.root):
+                if entry.startswith(f"{self.partition_cols[0]}="):
+                    self._remove_unknown(entry, current_paths)
+
+        for path in removed:
+            logger.info(f"Removed stale partition {path}")
+        return removed
+
+    def _remove_unknown(self, path, current_paths):
+        """Recursively delete files and directories under path that belong to no current partition."""
+        full_path = os.path.join(self.root, path)
+        if path in current_paths:
+            return
+        if not os.path.isdir(full_path) or not any(current.startswith(path + os.sep) for current in current_paths):
+            if os.path.isdir(full_path):
+                shutil.rmtree(full_path)
+            else:
+                os.remove(full_path)
+            return
+        for entry in os.listdir(full_path):
+            self._remove_unknown(os.path.join(path, entry), current_paths)
+
+    def partitions(self):
+        """Return the manifest entries of all stored partitions, keyed by path."""
+        return dict(self.manifest['partitions'])
+
+    def read(self, columns=None, filters=None):
+        """
+        Read features, loading only the needed partitions, row groups and columns.
+
+        Filters use the pyarrow DNF format: a list of (column, op, value)
+        tuples that must all hold, or a list of such lists, any of which may
+        hold. Conditions on partition columns select partitions from the
+        manifest by their original values (string targets are converted to
+        the stored type, so '2023' matches season 2023); the rest are pushed
+        down to the Parquet reader. Partition columns come back with the
+        dtype they had in the raw data.
+
+        Args:
+            columns: Feature columns to load (defaults to all); partition
+                columns are always included
+            filters: Row filters, e.g. [('season', '=', 2022), ('venue', '=', 'Home')]
+
+        Returns:
+            DataFrame of the matching rows
+        """
+        conjunctions = self._normalize_filters(filters)
+        file_columns = None
+        if columns is not None:
+            file_columns = [col for col in columns if col not in self.partition_cols]
+            columns = file_columns + self.partition_cols
+
+        frames = []
+        dtypes = {}
+        for path, entry in sorted(self.manifest['partitions'].items()):
+            file_filters = self._prune(entry, conjunctions)
+            if file_filters is None or entry['rows'] == 0:
+                continue
+            read_columns = None if file_columns is None else [col for col in file_columns if col in entry['columns']]
+
+            table = pq.read_table(
+                os.path.join(self.root, path, PARTITION_FILE),
+                columns=read_columns,
+                filters=file_filters or None
+            )
+            frame = table.to_pandas()
+            for col, value in entry['values'].items():
+                frame[col] = value
+            frames.append(frame)
+            dtypes.update(entry['dtypes'])
+
+        if not frames:
+            return pd.DataFrame(columns=columns)
+
+        features = pd.concat(frames, ignore_index=True)
+        for col, dtype in dtypes.items():
+            try:
+                features[col] = features[col].astype(dtype)
+            except (TypeError, ValueError):
+                # e.g. an integer season with missing values; keep the values as they are
+                pass
+        if columns is not None:
+            features = features[[col for col in columns if col in features.columns]]
+        return features
+
+    @staticmethod
+    def _normalize_filters(filters):
+        """Return filters as a list of conjunctions (lists of tuples)."""
+        if not filters:
+            return [[]]
+        if isinstance(filters[0], tuple):
+            return [list(filters)]
+        return [list(conjunction) for conjunction in filters]
+
+    def _prune(self, entry, conjunctions):
+        """
+        Apply the partition-column conditions of each conjunction to one partition.
+
+        A conjunction on a column the partition doesn't have can't match it.
+
+        Returns:
+            None if no conjunction can match the partition, [] if it matches
+            without row filters, else the remaining conjunctions for the reader
+        """
+        remaining = []
+        for conjunction in conjunctions:
+            row_conditions = []
+            matches = True
+            for col, op, target in conjunction:
+                if col in self.partition_cols:
+                    value = entry['values'][col]
+                    if op in ('in', 'not in'):
+                        target = {coerce_filter_target(value, item) for item in target}
+                    else:
+                        target = coerce_filter_target(value, target)
+                    try:
+                        matches = value is not None and FILTER_OPERATORS[op](value, target)
+                    except TypeError:
+                        matches = False
+                elif col in entry['columns']:
+                    row_conditions.append((col, op, target))
+                else:
+                    matches = False
+                if not matches:
+                    break
+            if not matches:
+                continue
+            if not row_conditions:
+                return []
+            remaining.append(row_conditions)
+        return remaining or None
@@ -1,9 +1,12 @@
 # data_pipeline/processors/integrator.py
 import pandas as pd
-import numpy as np
 import os
+import io
+import csv
+import uuid
 import logging
-from sqlalchemy import create_engine
+from collections import Counter
+from sqlalchemy import create_engine, inspect, text, bindparam
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,6 +15,21 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Matches per chunk in streaming refreshes
+DEFAULT_CHUNK_SIZE = 50000
+
+# match_ids per IN (...) lookup (stays under SQLite's bind limit)
+KEY_BATCH_SIZE = 500
+
+INTEGRATED_TABLE = 'integrated_matches'
+INTEGRATED_KEY = 'match_id'
+
+# Per-row hash of the integrated columns, stored to skip unchanged rows
+CONTENT_HASH_COLUMN = 'content_hash'
+
+ODDS_COLUMNS = ['home_win_odds', 'draw_odds', 'away_win_odds']
+WEATHER_COLUMNS = ['temperature_c', 'precipitation_mm', 'wind_kph', 'humidity', 'condition']
+
 class FootballDataIntegrator:
     def __init__(self):
         db_connection_string = os.getenv('DATABASE_URL')
@@ -21,8 +39,18 @@ class FootballDataIntegrator:
             
         self.db_engine = create_engine(db_connection_string)
         
-    def full_data_refresh(self):
-        """Run a complete data refresh pipeline"""
+    def full_data_refresh(self, streaming=False, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Run a complete data refresh pipeline
+        
+        Args:
+            streaming: Process matches in bounded chunks instead of all at once
+                (see _streaming_data_refresh)
+            chunk_size: Matches per chunk when streaming
+        """
+        if streaming:
+            return self._streaming_data_refresh(chunk_size)
+        
         logger.info("Starting full data refresh")
         
         try:
@@ -48,6 +76,256 @@ class FootballDataIntegrator:
             logger.error(f"Error in data refresh: {str(e)}")
             return False
     
+    def _streaming_data_refresh(self, chunk_size):
+        """
+        Refresh integrated_matches chunk by chunk, with memory bounded by chunk_size.
+        
+        Odds and weather are reduced to one row per match_id and joined to
+        each match chunk by index lookup. Matches are read twice: the first
+        pass collects the column means/modes used to fill missing values (so
+        fills match a full refresh) and checks the match_ids, the second
+        integrates, fills and merges each chunk with _load_integrated_data.
+        If the table has to be rewritten (new table, changed columns or no
+        unique match_id), all chunks are written to a new table first and it
+        is swapped in once complete, so readers never see a partial table.
+        """
+        logger.info(f"Starting streaming data refresh ({chunk_size} matches per chunk)")
+        
+        try:
+            odds_lookup = self._build_odds_lookup(chunk_size)
+            weather_lookup = self._build_weather_lookup(chunk_size)
+            
+            # Pass 1: fill values and match_ids over the whole history
+            fill_stats = {'columns': [], 'sums': Counter(), 'counts': Counter(), 'values': {}}
+            n_matches = 0
+            match_ids = []
+            has_key = True
+            for chunk in self._iter_match_chunks(chunk_size):
+                integrated = self._integrate_chunk(chunk, odds_lookup, weather_lookup)
+                self._update_fill_stats(fill_stats, integrated)
+                n_matches += len(integrated)
+                if INTEGRATED_KEY in integrated.columns:
+                    match_ids.append(integrated[INTEGRATED_KEY])
+                else:
+                    has_key = False
+            
+            if n_matches == 0:
+                logger.warning("No match data available")
+                return False
+            
+            fill_values = self._finalize_fill_values(fill_stats)
+            match_ids = pd.Index(pd.concat(match_ids, ignore_index=True)) if has_key else None
+            mergeable = match_ids is not None and not match_ids.hasnans and match_ids.is_unique
+            
+            with self.db_engine.connect() as conn:
+                table_columns = self._integrated_table_columns(conn)
+            same_columns = (table_columns is not None
+                            and set(table_columns) == set(fill_stats['columns']) | {CONTENT_HASH_COLUMN})
+            
+            # Pass 2: integrate, fill and upsert each chunk
+            chunks = self._iter_integrated_chunks(chunk_size, odds_lookup, weather_lookup,
+                                                  fill_stats['columns'], fill_values)
+            if not (mergeable and same_columns):
+                self._streaming_rewrite(chunks, n_matches, with_key=mergeable)
+            else:
+                n_loaded = 0
+                for integrated in chunks:
+                    self._upsert_chunk(integrated)
+                    n_loaded += len(integrated)
+                    logger.info(f"Loaded {n_loaded}/{n_matches} matches")
+            
+            logger.info("Streaming data refresh completed successfully")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error in streaming data refresh: {str(e)}")
+            return False
+    
+    def _iter_source_chunks(self, csv_path, table_name, chunk_size):
+        """Yield chunks of a CSV source, falling back to its database table."""
+        if os.path.exists(csv_path):
+            yield from pd.read_csv(csv_path, chunksize=chunk_size)
+        else:
+            logger.warning(f"Data file not found: {csv_path}")
+            yield from self._iter_table_chunks(table_name, chunk_size)
+    
+    def _iter_table_chunks(self, table_name, chunk_size):
+        """
+        Yield chunks of a database table read through a server-side cursor.
+        
+        SQLite has no server-side cursors and an open read blocks the upserts,
+        so there the table is paged by rowid with one short query per chunk.
+        """
+        try:
+            if self.db_engine.dialect.name == 'sqlite':
+                page = text(f"SELECT rowid AS _rowid, * FROM {table_name} WHERE rowid > :last ORDER BY rowid LIMIT :n")
+                last_rowid = 0
+                while True:
+                    with self.db_engine.connect() as conn:
+                        chunk = pd.read_sql(page, conn, params={'last': last_rowid, 'n': chunk_size})
+                    if chunk.empty:
+                        return
+                    last_rowid = int(chunk['_rowid'].iloc[-1])
+                    yield chunk.drop(columns='_rowid')
+            
+            with self.db_engine.connect().execution_options(stream_results=True) as conn:
+                yield from pd.read_sql(text(f"SELECT * FROM {table_name}"), conn, chunksize=chunk_size)
+        except Exception as e:
+            logger.error(f"Failed to stream {table_name} from database: {str(e)}")
+    
+    def _iter_match_chunks(self, chunk_size):
+        """Yield processed match data in chunks of at most chunk_size rows."""
+        jsonl_path = 'data/raw/fbref_matches.jsonl'
+        fbref_path = 'data/raw/fbref_matches.json'
+        
+        if os.path.exists(jsonl_path):
+            for chunk in pd.read_json(jsonl_path, lines=True, chunksize=chunk_size):
+                yield self._process_fbref_data(chunk.reset_index(drop=True))
+        elif os.path.exists(fbref_path):
+            # A JSON array can't be read incrementally; only the processing is chunked
+            logger.warning(f"{fbref_path} is not line-delimited; write {jsonl_path} to stream it")
+            fbref_data = pd.read_json(fbref_path)
+            for start in range(0, len(fbref_data), chunk_size):
+                yield self._process_fbref_data(fbref_data.iloc[start:start + chunk_size].reset_index(drop=True))
+        else:
+            logger.warning(f"FBref data file not found: {jsonl_path}")
+            yield from self._iter_table_chunks('matches', chunk_size)
+    
+    def _build_odds_lookup(self, chunk_size):
+        """
+        Mean odds per match_id over all bookmakers, aggregated chunk by chunk.
+        
+        The rows of the last match in each chunk are carried over to the next
+        one, so with odds grouped by match every mean is summed in one go,
+        exactly like the full refresh.
+        """
+        partials = []
+        carry = None
+        for chunk in self._iter_source_chunks('data/processed/latest_odds.csv', 'match_odds', chunk_size):
+            odds_cols = [col for col in ODDS_COLUMNS if col in chunk.columns]
+            if 'match_id' not in chunk.columns or not odds_cols:
+                return None
+            if carry is not None:
+                chunk = pd.concat([carry, chunk], ignore_index=True)
+            is_last_match = chunk['match_id'] == chunk['match_id'].iloc[-1]
+            carry = chunk[is_last_match]
+            partials.append(self._odds_partial(chunk[~is_last_match], odds_cols))
+        
+        if carry is not None:
+            partials.append(self._odds_partial(carry, [col for col in ODDS_COLUMNS if col in carry.columns]))
+        if not partials:
+            return None
+        
+        totals = pd.concat(partials).groupby(level=0).sum()
+        lookup = totals['sum'] / totals['count'].where(totals['count'] > 0)
+        logger.info(f"Built odds lookup for {len(lookup)} matches")
+        return lookup
+    
+    @staticmethod
+    def _odds_partial(odds, odds_cols):
+        """Per-match sums and counts of the odds columns."""
+        grouped = odds.groupby('match_id')[odds_cols]
+        return pd.concat({'sum': grouped.sum(), 'count': grouped.count()}, axis=1)
+    
+    def _build_weather_lookup(self, chunk_size):
+        """Weather per match_id (first record per match), read chunk by chunk."""
+        partials = []
+        for chunk in self._iter_source_chunks('data/processed/match_weather.csv', 'weather_conditions', chunk_size):
+            weather_cols = [col for col in WEATHER_COLUMNS if col in chunk.columns]
+            if 'match_id' not in chunk.columns or not weather_cols:
+                return None
+            partials.append(chunk[['match_id'] + weather_cols].drop_duplicates('match_id'))
+        
+        if not partials:
+            return None
+        
+        lookup = pd.concat(partials).drop_duplicates('match_id').set_index('match_id')
+        logger.info(f"Built weather lookup for {len(lookup)} matches")
+        return lookup
+    
+    def _integrate_chunk(self, match_data, odds_lookup, weather_lookup):
+        """Attach odds and weather to a chunk of matches by match_id lookup."""
+        integrated = match_data
+        if 'match_id' in integrated.columns:
+            if odds_lookup is not None:
+                integrated = integrated.join(odds_lookup, on='match_id')
+            if weather_lookup is not None:
+                integrated = integrated.join(weather_lookup, on='match_id')
+        return integrated
+    
+    def _iter_integrated_chunks(self, chunk_size, odds_lookup, weather_lookup, columns, fill_values):
+        """Yield integrated, filled match chunks with the given columns."""
+        for chunk in self._iter_match_chunks(chunk_size):
+            integrated = self._integrate_chunk(chunk, odds_lookup, weather_lookup)
+            yield integrated.reindex(columns=columns).fillna(fill_values)
+    
+    def _streaming_rewrite(self, chunks, n_matches, with_key=True):
+        """
+        Replace integrated_matches with the streamed chunks.
+        
+        Chunks are committed one by one into a uniquely named new table, which
+        is swapped in once every chunk is written. Until then readers see the
+        old table; if a chunk fails, the new table is dropped and the old one
+        is kept.
+        """
+        new_table = f"{INTEGRATED_TABLE}_new_{uuid.uuid4().hex}"
+        try:
+            n_loaded = 0
+            for integrated in chunks:
+                integrated = self._with_content_hash(integrated)
+                with self.db_engine.begin() as conn:
+                    integrated.to_sql(new_table, conn, if_exists='append', index=False,
+                                      method=self._bulk_insert_method())
+                n_loaded += len(integrated)
+                logger.info(f"Wrote {n_loaded}/{n_matches} matches to {new_table}")
+            
+            with self.db_engine.begin() as conn:
+                self._swap_in_table(conn, new_table, with_key)
+            logger.info(f"Rewrote {INTEGRATED_TABLE} with {n_loaded} records")
+        except Exception:
+            with self.db_engine.begin() as conn:
+                conn.execute(text(f"DROP TABLE IF EXISTS {new_table}"))
+            raise
+    
+    def _update_fill_stats(self, fill_stats, df):
+        """Accumulate the column sums/counts and value counts behind _fill_missing_values."""
+        for col in df.columns:
+            if col not in fill_stats['columns']:
+                fill_stats['columns'].append(col)
+        
+        for col in df.select_dtypes(include=['number']).columns:
+            if 'id' in col.lower():
+                continue
+            fill_stats['sums'][col] += df[col].sum()
+            fill_stats['counts'][col] += df[col].count()
+        
+        for col in df.select_dtypes(include=['object']).columns:
+            if 'id' in col.lower() or 'name' in col.lower() or 'team' in col.lower():
+                continue
+            fill_stats['values'].setdefault(col, Counter()).update(df[col].dropna().value_counts().to_dict())
+    
+    def _finalize_fill_values(self, fill_stats):
+        """Turn accumulated stats into per-column fill values: means, and modes (smallest on ties)."""
+        fill_values = {}
+        for col, count in fill_stats['counts'].items():
+            if count > 0:
+                fill_values[col] = fill_stats['sums'][col] / count
+        
+        for col, value_counts in fill_stats['values'].items():
+            if col in fill_values:
+                continue
+            if value_counts:
+                top = max(value_counts.values())
+                fill_values[col] = min(value for value, n in value_counts.items() if n == top)
+            else:
+                fill_values[col] = ''
+        return fill_values
+    
+    def _upsert_chunk(self, df):
+        """Merge one streamed chunk into integrated_matches."""
+        if not self._load_integrated_data(df, allow_rewrite=False):
+            raise RuntimeError(f"Failed to load chunk of {len(df)} matches")
+    
     def _extract_match_data(self):
         """Extract match data from scraped sources"""
         logger.info("Extracting match data")
@@ -237,15 +515,157 @@ class FootballDataIntegrator:
         
         return df
     
-    def _load_integrated_data(self, df):
-        """Load integrated data to database"""
+    def _load_integrated_data(self, df, allow_rewrite=True):
+        """
+        Load integrated data to database
+        
+        Rows are merged into integrated_matches on match_id: only new rows and
+        rows whose content hash changed are staged (COPY on PostgreSQL) and
+        upserted, in one transaction, so readers never see a partial table.
+        When the table doesn't exist yet, its columns changed or the rows
+        have no unique match_id, it is rewritten instead: built under a new
+        name and swapped in within the same transaction. Rows missing from df
+        are left in place.
+        
+        Args:
+            df: Integrated match data
+            allow_rewrite: Allow the rewrite fallback; without it, rows without
+                a match_id are appended and other mismatches fail
+        
+        Returns:
+            True on success
+        """
         logger.info(f"Loading {len(df)} records to database")
         
         try:
-            # Save to integrated_matches table
-            df.to_sql('integrated_matches', self.db_engine, if_exists='replace', index=False)
-            logger.info("Data loaded successfully")
+            df = self._with_content_hash(df)
+            
+            with self.db_engine.begin() as conn:
+                table_columns = self._integrated_table_columns(conn)
+                
+                has_key = INTEGRATED_KEY in df.columns
+                mergeable = has_key and df[INTEGRATED_KEY].notna().all() and not df[INTEGRATED_KEY].duplicated().any()
+                same_columns = table_columns is not None and set(table_columns) == set(df.columns)
+                
+                if not (mergeable and same_columns):
+                    if allow_rewrite:
+                        self._rewrite_table(conn, df, with_key=mergeable)
+                        logger.info(f"Rewrote {INTEGRATED_TABLE} with {len(df)} records")
+                        return True
+                    if not has_key and same_columns:
+                        df.to_sql(INTEGRATED_TABLE, conn, if_exists='append', index=False, method=self._bulk_insert_method())
+                        return True
+                    raise ValueError(f"Records can't be merged into {INTEGRATED_TABLE} on {INTEGRATED_KEY}")
+                
+                changed = self._changed_rows(conn, df)
+                if changed.empty:
+                    logger.info("No new or changed records")
+                    return True
+                
+                self._merge_rows(conn, changed[table_columns])
+            
+            logger.info(f"Upserted {len(changed)} new or changed records")
             return True
         except Exception as e:
             logger.error(f"Error loading data to database: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+    
+    def _integrated_table_columns(self, conn):
+        """Column names of integrated_matches, or None if the table doesn't exist."""
+        inspector = inspect(conn)
+        if not inspector.has_table(INTEGRATED_TABLE):
+            return None
+        return [column['name'] for column in inspector.get_columns(INTEGRATED_TABLE)]
+    
+    def _with_content_hash(self, df):
+        """Return df with a freshly computed content hash column."""
+        df = df.drop(columns=CONTENT_HASH_COLUMN, errors='ignore')
+        df[CONTENT_HASH_COLUMN] = self._content_hashes(df)
+        return df
+    
+    def _content_hashes(self, df):
+        """
+        Per-row hash over every column, as 16-digit hex strings.
+        
+        Columns are hashed in sorted order, so the streaming and full refreshes
+        (which order columns differently) agree on unchanged rows.
+        """
+        return pd.util.hash_pandas_object(df[sorted(df.columns)], index=False).map('{:016x}'.format)
+    
+    def _changed_rows(self, conn, df):
+        """Return the rows of df that are new or whose stored content hash differs."""
+        lookup = text(
+            f"SELECT {INTEGRATED_KEY}, {CONTENT_HASH_COLUMN} FROM {INTEGRATED_TABLE} WHERE {INTEGRATED_KEY} IN :ids"
+        ).bindparams(bindparam('ids', expanding=True))
+        
+        ids = df[INTEGRATED_KEY].tolist()
+        if not ids:
+            return df
+        stored = pd.concat([
+            pd.read_sql(lookup, conn, params={'ids': ids[start:start + KEY_BATCH_SIZE]})
+            for start in range(0, len(ids), KEY_BATCH_SIZE)
+        ], ignore_index=True)
+        
+        stored_hashes = stored.set_index(INTEGRATED_KEY)[CONTENT_HASH_COLUMN]
+        unchanged = df[CONTENT_HASH_COLUMN].to_numpy() == df[INTEGRATED_KEY].map(stored_hashes).to_numpy()
+        return df[~unchanged]
+    
+    def _merge_rows(self, conn, rows):
+        """
+        Stage rows in a temporary table shaped like integrated_matches and upsert them on match_id.
+        
+        The staging table is private to this connection and uniquely named, so
+        concurrent refreshes don't share it, and it disappears with the
+        transaction (ON COMMIT DROP) or connection if the merge fails.
+        """
+        staging_table = f"{INTEGRATED_TABLE}_staging_{uuid.uuid4().hex}"
+        quote = conn.dialect.identifier_preparer.quote
+        on_commit = "ON COMMIT DROP " if conn.dialect.name == 'postgresql' else ""
+        
+        conn.execute(text(
+            f"CREATE TEMPORARY TABLE {staging_table} {on_commit}AS SELECT * FROM {INTEGRATED_TABLE} WHERE 1 = 0"
+        ))
+        rows.to_sql(staging_table, conn, if_exists='append', index=False, method=self._bulk_insert_method())
+        
+        columns = ", ".join(quote(col) for col in rows.columns)
+        updates = ", ".join(f"{quote(col)} = excluded.{quote(col)}" for col in rows.columns if col != INTEGRATED_KEY)
+        conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {INTEGRATED_TABLE}_{INTEGRATED_KEY}_key "
+                          f"ON {INTEGRATED_TABLE} ({INTEGRATED_KEY})"))
+        # WHERE true keeps SQLite from parsing ON CONFLICT as part of the SELECT
+        conn.execute(text(
+            f"INSERT INTO {INTEGRATED_TABLE} ({columns}) SELECT {columns} FROM {staging_table} WHERE true "
+            f"ON CONFLICT ({INTEGRATED_KEY}) DO UPDATE SET {updates}"
+        ))
+        if not on_commit:
+            conn.execute(text(f"DROP TABLE {staging_table}"))
+    
+    def _rewrite_table(self, conn, df, with_key=True):
+        """Replace integrated_matches with df by building a new table and swapping it in."""
+        new_table = f"{INTEGRATED_TABLE}_new"
+        conn.execute(text(f"DROP TABLE IF EXISTS {new_table}"))
+        df.to_sql(new_table, conn, index=False, method=self._bulk_insert_method())
+        self._swap_in_table(conn, new_table, with_key)
+    
+    def _swap_in_table(self, conn, new_table, with_key=True):
+        """Replace integrated_matches with new_table (renamed), adding the match_id index."""
+        conn.execute(text(f"DROP TABLE IF EXISTS {INTEGRATED_TABLE}"))
+        conn.execute(text(f"ALTER TABLE {new_table} RENAME TO {INTEGRATED_TABLE}"))
+        if with_key:
+            conn.execute(text(f"CREATE UNIQUE INDEX {INTEGRATED_TABLE}_{INTEGRATED_KEY}_key "
+                              f"ON {INTEGRATED_TABLE} ({INTEGRATED_KEY})"))
+    
+    def _bulk_insert_method(self):
+        """pandas to_sql insert method: COPY on PostgreSQL, executemany elsewhere."""
+        return _copy_insert if self.db_engine.dialect.name == 'postgresql' else None
+
+
+def _copy_insert(table, conn, keys, data_iter):
+    """pandas to_sql method that bulk-loads rows with PostgreSQL COPY FROM STDIN."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(data_iter)
+    buffer.seek(0)
+    
+    columns = ", ".join(f'"{key}"' for key in keys)
+    table_name = f'"{table.schema}"."{table.name}"' if table.schema else f'"{table.name}"'
+    with conn.connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table_name} ({columns}) FROM STDIN WITH CSV", buffer)
@@ -0,0 +1,194 @@
+# ml/compiled_trees.py
+import json
+import numpy as np
+from typing import List
+
+
+class CompiledForest:
+    """
+    Tree ensemble flattened into contiguous NumPy node arrays.
+
+    All trees share one set of node arrays; leaves point back at themselves so
+    every row/tree pair can be advanced in lockstep for `max_depth` steps
+    without branching. Inputs are plain 2-D arrays in training column order
+    and are not validated, which is what makes single-row calls cheap.
+    """
+
+    def __init__(self, feature, threshold, left, right, default_left, leaf_value, roots, max_depth, kind, base_margin=0.0):
+        """
+        Initialize the compiled forest.
+
+        Args:
+            feature: Split feature per node (0 for leaves)
+            threshold: Split threshold per node (+inf for leaves)
+            left: Global index of the left child (self for leaves)
+            right: Global index of the right child (self for leaves)
+            default_left: Whether missing values go left, per node
+            leaf_value: Class-1 probability (RF) or leaf margin (XGBoost) per node
+            roots: Global index of each tree's root
+            max_depth: Depth of the deepest tree
+            kind: 'randomforest' or 'xgboost'
+            base_margin: XGBoost margin added to the sum of leaf values
+        """
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.kind = kind
+        self.base_margin = base_margin
+
+    @classmethod
+    def _from_trees(cls, trees: List[dict], kind: str, base_margin: float = 0.0) -> 'CompiledForest':
+        """Concatenate per-tree node arrays into one forest, offsetting child indices."""
+        offsets = np.cumsum([0] + [len(tree['feature']) for tree in trees])
+        parts = {name: [] for name in ('feature', 'threshold', 'left', 'right', 'default_left', 'leaf_value')}
+        max_depth = 0
+
+        for offset, tree in zip(offsets, trees):
+            n_nodes = len(tree['feature'])
+            is_leaf = tree['left'] < 0
+            node_ids = np.arange(n_nodes)
+
+            parts['feature'].append(np.where(is_leaf, 0, tree['feature']))
+            parts['threshold'].append(np.where(is_leaf, np.inf, tree['threshold']))
+            parts['left'].append(np.where(is_leaf, node_ids, tree['left']) + offset)
+            parts['right'].append(np.where(is_leaf, node_ids, tree['right']) + offset)
+            parts['default_left'].append(np.where(is_leaf, True, tree['default_left']))
+            parts['leaf_value'].append(np.where(is_leaf, tree['leaf_value'], 0.0))
+            max_depth = max(max_depth, tree['depth'])
+
+        return cls(
+            feature=np.concatenate(parts['feature']).astype(np.intp),
+            threshold=np.concatenate(parts['threshold']).astype(trees[0]['threshold'].dtype),
+            left=np.concatenate(parts['left']).astype(np.intp),
+            right=np.concatenate(parts['right']).astype(np.intp),
+            default_left=np.concatenate(parts['default_left']).astype(bool),
+            leaf_value=np.concatenate(parts['leaf_value']).astype(np.float64),
+            roots=offsets[:-1].astype(np.intp),
+            max_depth=max_depth,
+            kind=kind,
+            base_margin=base_margin
+        )
+
+    @classmethod
+    def from_sklearn(cls, forest) -> 'CompiledForest':
+        """
+        Compile a fitted binary sklearn RandomForestClassifier.
+
+        Args:
+            forest: Fitted RandomForestClassifier
+
+        Returns:
+            CompiledForest whose predict_proba matches forest.predict_proba
+        """
+        if len(forest.classes_) != 2:
+            raise ValueError("Only binary RandomForest classifiers can be compiled")
+
+        trees = []
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            # Leaf class-1 probability, normalized the way DecisionTreeClassifier.predict_proba does
+            counts = tree.value[:, 0, :]
+            totals = counts.sum(axis=1)
+            totals[totals == 0] = 1.0
+            trees.append({
+                'feature': tree.feature,
+                'threshold': tree.threshold,
+                'left': tree.children_left,
+                'right': tree.children_right,
+                'default_left': np.zeros(tree.node_count, dtype=bool),
+                'leaf_value': counts[:, 1] / totals,
+                'depth': tree.max_depth
+            })
+
+        return cls._from_trees(trees, kind='randomforest')
+
+    @classmethod
+    def from_xgboost(cls, model) -> 'CompiledForest':
+        """
+        Compile a fitted binary:logistic XGBClassifier from its JSON model dump.
+
+        Args:
+            model: Fitted XGBClassifier
+
+        Returns:
+            CompiledForest whose predict_proba matches model.predict_proba
+        """
+        learner = json.loads(bytes(model.get_booster().save_raw(raw_format='json')))['learner']
+        if learner['objective']['name'] != 'binary:logistic' or learner['gradient_booster']['name'] != 'gbtree':
+            raise ValueError("Only binary:logistic gbtree XGBoost models can be compiled")
+
+        base_score = float(learner['learner_model_param']['base_score'])
+        base_margin = float(np.log(base_score / (1.0 - base_score)))
+
+        trees = []
+        for tree in learner['gradient_booster']['model']['trees']:
+            left = np.asarray(tree['left_children'], dtype=np.intp)
+            right = np.asarray(tree['right_children'], dtype=np.intp)
+            trees.append({
+                'feature': np.asarray(tree['split_indices'], dtype=np.intp),
+                'threshold': np.asarray(tree['split_conditions'], dtype=np.float32),
+                'left': left,
+                'right': right,
+                'default_left': np.asarray(tree['default_left'], dtype=bool),
+                # Leaves store their value in split_conditions
+                'leaf_value': np.asarray(tree['split_conditions'], dtype=np.float64),
+                'depth': cls._tree_depth(left, right)
+            })
+
+        return cls._from_trees(trees, kind='xgboost', base_margin=base_margin)
+
+    @staticmethod
+    def _tree_depth(left: np.ndarray, right: np.ndarray) -> int:
+        """Depth of a tree given its child index arrays."""
+        depth, level = 0, np.array([0])
+        while True:
+            level = np.concatenate([left[level], right[level]])
+            level = level[level >= 0]
+            if len(level) == 0:
+                return depth
+            depth += 1
+
+    def _leaf_values(self, X: np.ndarray) -> np.ndarray:
+        """Return the (n_rows, n_trees) leaf value reached by each row in each tree."""
+        # Both libraries split on float32 features
+        X = np.asarray(X, dtype=np.float32)
+
+        nodes = np.broadcast_to(self.roots, (X.shape[0], len(self.roots))).copy()
+        missing = np.isnan(X)
+        has_missing = missing.any()
+
+        for _ in range(self.max_depth):
+            feature = self.feature[nodes]
+            values = np.take_along_axis(X, feature, axis=1)
+            if self.kind == 'randomforest':
+                go_left = values <= self.threshold[nodes]
+            else:
+                go_left = values < self.threshold[nodes]
+            if has_missing:
+                go_left = np.where(np.take_along_axis(missing, feature, axis=1), self.default_left[nodes], go_left)
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        return self.leaf_value[nodes]
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """
+        Return [P(class 0), P(class 1)] for each row of a 2-D float array.
+
+        Args:
+            X: Features in training column order
+
+        Returns:
+            Array of shape (n_rows, 2)
+        """
+        leaves = self._leaf_values(X)
+        if self.kind == 'randomforest':
+            positive = leaves.mean(axis=1)
+        else:
+            margin = self.base_margin + leaves.sum(axis=1)
+            positive = 1.0 / (1.0 + np.exp(-margin))
+        return np.column_stack([1.0 - positive, positive])
@@ -4,7 +4,11 @@ import xgboost as xgb
 import pandas as pd
 import numpy as np
 import joblib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Tuple, Optional, Union
+from ml.model import TOP_FEATURES_K
 
 class EnsemblePredictor:
     """
@@ -18,7 +22,10 @@ class EnsemblePredictor:
                  xgb_learning_rate=0.05,  # Reduced learning rate for better generalization
                  xgb_max_depth=3,         # Reduced depth to avoid overfitting
                  weights=(0.7, 0.3),      # Give more weight to RandomForest (70%)
-                 model_version="1.0"):
+                 model_version="1.0",
+                 parallel_training=False,
+                 n_jobs=None,
+                 inference_backend="sklearn"):
         """
         Initialize the ensemble model with RandomForest and XGBoost.
         
@@ -30,6 +37,11 @@ class EnsemblePredictor:
             xgb_max_depth: Maximum tree depth for XGBoost
             weights: Tuple of weights for (RandomForest, XGBoost)
             model_version: Version string for this model
+            parallel_training: Fit RandomForest and XGBoost concurrently, each
+                with half of the core budget
+            n_jobs: Total cores available for training (defaults to all cores)
+            inference_backend: 'sklearn' or 'compiled' (flattened NumPy trees, see
+                ml.compiled_trees)
         """
         # RandomForest model
         self.rf_model = RandomForestClassifier(
@@ -50,7 +62,9 @@ class EnsemblePredictor:
             eval_metric='logloss'
         )
         
-        # Weights for ensemble averaging
+        # Weights for ensemble averaging (see the weights property)
+        self.feature_importance = None
+        self.top_features = None
         self.weights = weights
         
         # Store hyperparameters
@@ -69,9 +83,36 @@ class EnsemblePredictor:
         self.predictors = []
         self.model_version = model_version
         
+        # Training execution mode
+        self.parallel_training = parallel_training
+        self.n_jobs = n_jobs
+        
+        # Inference backend; compiled trees are built lazily after training
+        self.inference_backend = inference_backend
+        self.compiled_trees = None
+        
         # Training metrics
         self.metrics = {}
+        self.train_times = {}
         
+    @property
+    def weights(self):
+        """Blend weights as (RandomForest, XGBoost)."""
+        return self._weights
+    
+    @weights.setter
+    def weights(self, weights):
+        self._weights = tuple(weights)
+        # Cached importance is weighted, so it must follow the blend
+        if getattr(self, 'feature_importance', None) is not None:
+            self._reweight_feature_importance()
+    
+    def __setstate__(self, state):
+        """Restore a pickled model, including ones saved before weights was a property."""
+        if 'weights' in state:
+            state['_weights'] = tuple(state.pop('weights'))
+        self.__dict__.update(state)
+    
     def train(self, X, y):
         """
         Train both models on the same data.
@@ -86,20 +127,65 @@ class EnsemblePredictor:
             
         # Store feature names
         self.predictors = X.columns.tolist()
+        self.compiled_trees = None
         
-        # Train RandomForest
-        print("Training RandomForest model...")
-        self.rf_model.fit(X, y)
+        # Older pickles predate the execution mode settings
+        parallel_training = getattr(self, 'parallel_training', False)
+        n_jobs = getattr(self, 'n_jobs', None)
+        total_cores = n_jobs or os.cpu_count() or 1
         
-        # Train XGBoost
-        print("Training XGBoost model...")
-        self.xgb_model.fit(X, y)
+        # Training core counts only apply to fit; the pickled members keep their own
+        member_jobs = [(model, model.get_params()['n_jobs']) for model in (self.rf_model, self.xgb_model)]
+        
+        start = time.perf_counter()
+        try:
+            if parallel_training and total_cores >= 2:
+                # Split the core budget so the two members don't oversubscribe
+                rf_jobs = total_cores - total_cores // 2
+                xgb_jobs = total_cores // 2
+                self.rf_model.set_params(n_jobs=rf_jobs)
+                self.xgb_model.set_params(n_jobs=xgb_jobs)
+                
+                print(f"Training RandomForest ({rf_jobs} cores) and XGBoost ({xgb_jobs} cores) in parallel...")
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    rf_future = executor.submit(self._fit_member, self.rf_model, X, y)
+                    xgb_future = executor.submit(self._fit_member, self.xgb_model, X, y)
+                    rf_seconds = rf_future.result()
+                    xgb_seconds = xgb_future.result()
+            else:
+                if n_jobs:
+                    self.rf_model.set_params(n_jobs=n_jobs)
+                    self.xgb_model.set_params(n_jobs=n_jobs)
+                
+                # Train RandomForest
+                print("Training RandomForest model...")
+                rf_seconds = self._fit_member(self.rf_model, X, y)
+                
+                # Train XGBoost
+                print("Training XGBoost model...")
+                xgb_seconds = self._fit_member(self.xgb_model, X, y)
+        finally:
+            for model, jobs in member_jobs:
+                model.set_params(n_jobs=jobs)
+        
+        self.train_times = {
+            'rf_train_seconds': rf_seconds,
+            'xgb_train_seconds': xgb_seconds,
+            'train_seconds': time.perf_counter() - start
+        }
         
         # Calculate feature importance
         self._calculate_feature_importance()
         
         return self
     
+    @staticmethod
+    def _fit_member(model, X, y):
+        """Fit one ensemble member and return its wall time in seconds."""
+        start = time.perf_counter()
+        model.fit(X, y)
+        return time.perf_counter() - start
+    
     def tune_weights(self, X_val, y_val):
         """
         Tune the weights of ensemble models based on validation performance.
@@ -142,12 +228,8 @@ class EnsemblePredictor:
         Returns:
             Array of predictions (0 or 1)
         """
-        # Get probability predictions
-        rf_proba = self.rf_model.predict_proba(X)[:, 1]
-        xgb_proba = self.xgb_model.predict_proba(X)[:, 1]
-        
-        # Weighted average
-        ensemble_proba = self.weights[0] * rf_proba + self.weights[1] * xgb_proba
+        # Weighted average of the members' probabilities
+        ensemble_proba = self.predict_proba(X)[:, 1]
         
         # Convert to class predictions
         return (ensemble_proba > 0.5).astype(int)
@@ -166,6 +248,13 @@ class EnsemblePredictor:
             # Models haven't been trained, return default
             return np.array([[0.5, 0.5] for _ in range(len(X))])
         
+        if getattr(self, 'inference_backend', 'sklearn') == 'compiled':
+            compiled = self.get_compiled_trees()
+            if compiled is not None:
+                proba = self._predict_proba_compiled(X, *compiled)
+                if proba is not None:
+                    return proba
+        
         # Get probability predictions from each model
         rf_proba = self.rf_model.predict_proba(X)
         xgb_proba = self.xgb_model.predict_proba(X)
@@ -177,26 +266,95 @@ class EnsemblePredictor:
             
         return ensemble_proba
         
+    def set_inference_backend(self, backend):
+        """
+        Select the predict_proba backend.
+        
+        Args:
+            backend: 'sklearn' or 'compiled'
+        """
+        if backend not in ('sklearn', 'compiled'):
+            raise ValueError(f"Unknown inference backend: {backend}")
+        self.inference_backend = backend
+        if backend == 'compiled' and hasattr(self.rf_model, 'classes_') and hasattr(self.xgb_model, 'classes_'):
+            # Compile eagerly so the first prediction doesn't pay for it
+            self.get_compiled_trees()
+        return self
+    
+    def get_compiled_trees(self):
+        """
+        Return (rf, xgb) CompiledForest members, compiling them on first use.
+        
+        Returns:
+            Tuple of CompiledForest, or None if the members can't be compiled
+        """
+        compiled = getattr(self, 'compiled_trees', None)
+        if compiled is not None:
+            return compiled
+        
+        try:
+            from ml.compiled_trees import CompiledForest
+            compiled = (CompiledForest.from_sklearn(self.rf_model), CompiledForest.from_xgboost(self.xgb_model))
+        except Exception as e:
+            print(f"Could not compile ensemble trees, using sklearn inference: {e}")
+            self.inference_backend = 'sklearn'
+            return None
+        
+        self.compiled_trees = compiled
+        return compiled
+    
+    def _predict_proba_compiled(self, X, rf_compiled, xgb_compiled):
+        """
+        Blend member probabilities from the compiled trees.
+        
+        Returns None for input with missing or infinite values (after the
+        float32 cast both libraries split on), so the caller falls back to the
+        sklearn path and raises the same ValueError as the RandomForest.
+        """
+        if isinstance(X, pd.DataFrame):
+            if self.predictors and X.columns.tolist() != self.predictors:
+                X = X[self.predictors]
+            X = X.to_numpy(dtype=np.float64)
+        else:
+            X = np.asarray(X, dtype=np.float64)
+        
+        with np.errstate(over='ignore'):
+            if not np.isfinite(X.astype(np.float32)).all():
+                return None
+        
+        rf_proba = rf_compiled.predict_proba(X)
+        xgb_proba = xgb_compiled.predict_proba(X)
+        return self.weights[0] * rf_proba + self.weights[1] * xgb_proba
+    
     def _calculate_feature_importance(self):
-        """Calculate and store feature importance from both models."""
+        """Calculate and store feature importance from both models (once per fit)."""
         if not self.predictors:
             return
             
-        # Get RF feature importance
+        # Get RF feature importance (averaged over all trees on every access)
         rf_importance = self.rf_model.feature_importances_
         
         # Get XGBoost feature importance
         xgb_importance = self.xgb_model.feature_importances_
         
-        # Combine and create weighted importance DataFrame
-        weighted_imp = pd.DataFrame({
+        # Keep the member importances; the weighted column follows the blend weights
+        self.feature_importance = pd.DataFrame({
             'Feature': self.predictors,
-            'Importance': self.weights[0] * rf_importance + self.weights[1] * xgb_importance,
+            'Importance': 0.0,
             'RF_Importance': rf_importance,
             'XGB_Importance': xgb_importance
-        }).sort_values('Importance', ascending=False)
+        })
+        self._reweight_feature_importance()
+    
+    def _reweight_feature_importance(self):
+        """Recompute weighted importance and the top-feature payload from the cached member importances."""
+        importance = self.feature_importance
+        weighted_imp = importance.assign(
+            Importance=self.weights[0] * importance['RF_Importance'] + self.weights[1] * importance['XGB_Importance']
+        ).sort_values('Importance', ascending=False)
         
         self.feature_importance = weighted_imp
+        self.top_features = tuple(weighted_imp.head(TOP_FEATURES_K).to_dict('records'))
     
     def get_feature_importance(self):
         """
@@ -205,7 +363,7 @@ class EnsemblePredictor:
         Returns:
             DataFrame with feature importance
         """
-        if hasattr(self, 'feature_importance'):
+        if getattr(self, 'feature_importance', None) is not None:
             return self.feature_importance
         
         # Return default if not calculated
@@ -214,6 +372,23 @@ class EnsemblePredictor:
             'Importance': [0.2] * (len(self.predictors) if self.predictors else 1)
         })
     
+    def get_top_features(self, k=TOP_FEATURES_K):
+        """
+        Return the top-k features as records, serialized once per fit or weight change.
+        
+        Args:
+            k: Number of features
+            
+        Returns:
+            Tuple of {'Feature', 'Importance', ...} records
+        """
+        top_features = getattr(self, 'top_features', None)
+        if top_features is None or len(top_features) < k:
+            top_features = tuple(self.get_feature_importance().head(max(k, TOP_FEATURES_K)).to_dict('records'))
+            if getattr(self, 'feature_importance', None) is not None:
+                self.top_features = top_features
+        return top_features[:k]
+    
     def evaluate(self, X_test, y_test):
         """
         Evaluate model performance on test data.
@@ -253,6 +428,9 @@ class EnsemblePredictor:
         metrics['xgb_accuracy'] = accuracy_score(y_test, xgb_pred)
         metrics['xgb_auc'] = roc_auc_score(y_test, xgb_proba)
         
+        # Wall time of the last training run
+        metrics.update(getattr(self, 'train_times', {}))
+        
         # Store metrics
         self.metrics = metrics
         
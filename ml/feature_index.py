@@ -0,0 +1,82 @@
+# ml/feature_index.py
+import pandas as pd
+from typing import Dict, Optional
+
+
+class PredictionFeatureIndex:
+    """
+    Prediction-time lookup of team codes and latest team form.
+
+    Built once per loaded dataset so that a prediction request resolves all of
+    its features with dictionary lookups instead of scanning the historical data.
+    """
+
+    def __init__(self, team_codes: Optional[Dict] = None, latest_form: Optional[Dict] = None, window: int = 3):
+        """
+        Initialize the index.
+
+        Args:
+            team_codes: Mapping of team name to team_code
+            latest_form: Mapping of team name to {rolling column: value}
+            window: Number of recent matches the form values are averaged over
+        """
+        self.team_codes = team_codes or {}
+        self.latest_form = latest_form or {}
+        self.window = window
+
+    @classmethod
+    def build(cls, processed_data: Optional[pd.DataFrame], window: int = 3) -> 'PredictionFeatureIndex':
+        """
+        Build the index from processed match data.
+
+        Latest form is the form going into each team's next match: the mean of
+        the stat over the team's last `window` matches, i.e. the value the
+        matching *_rolling column would take on the team's next row.
+
+        Args:
+            processed_data: Output of prepare_model_data
+            window: Number of recent matches to average over
+
+        Returns:
+            A new PredictionFeatureIndex
+        """
+        if processed_data is None or processed_data.empty or 'team' not in processed_data.columns:
+            return cls(window=window)
+
+        team_codes = {}
+        if 'team_code' in processed_data.columns:
+            team_codes_df = processed_data.drop_duplicates('team')[['team', 'team_code']]
+            team_codes = dict(zip(team_codes_df['team'], team_codes_df['team_code']))
+
+        rolling_cols = [col for col in processed_data.columns if col.endswith('_rolling')]
+        latest_form = {}
+
+        if rolling_cols:
+            data = processed_data.sort_values('date', kind='mergesort') if 'date' in processed_data.columns else processed_data
+            recent = data.groupby('team').tail(window).groupby('team')
+
+            # Average raw stats where available, otherwise carry the last rolling value
+            form_columns = {}
+            for col in rolling_cols:
+                base_col = col.split('_')[0]
+                if base_col in data.columns and pd.api.types.is_numeric_dtype(data[base_col]):
+                    form_columns[col] = recent[base_col].mean()
+                else:
+                    form_columns[col] = recent[col].last()
+
+            form_df = pd.DataFrame(form_columns)
+            for team, row in zip(form_df.index, form_df.to_dict('records')):
+                latest_form[team] = {col: float(value) for col, value in row.items() if pd.notna(value)}
+
+        return cls(team_codes=team_codes, latest_form=latest_form, window=window)
+
+    def get_team_code(self, team: str, default: int = 0) -> int:
+        """Return the team_code for a team, or default if unknown."""
+        return self.team_codes.get(team, default)
+
+    def get_latest_form(self, team: str) -> Dict[str, float]:
+        """Return the latest rolling stats for a team (empty if unknown)."""
+        return self.latest_form.get(team, {})
+
+    def __len__(self):
+        return len(self.team_codes)
@@ -0,0 +1,223 @@
+# ml/hyperparameter_search.py
+import os
+import time
+import multiprocessing
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Optional
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import ParameterSampler, TimeSeriesSplit
+
+from ml.ensemble_model import EnsemblePredictor
+from ml.model_versioning import ModelVersionTracker
+
+# Search space sampled for each trial
+DEFAULT_SEARCH_SPACE = {
+    'rf_n_estimators': [100, 200, 300],
+    'rf_min_samples_split': [2, 5, 10, 20],
+    'xgb_n_estimators': [50, 100, 200],
+    'xgb_learning_rate': [0.01, 0.03, 0.05, 0.1],
+    'xgb_max_depth': [2, 3, 4, 6],
+}
+
+# RandomForest blend weights evaluated for every trial (XGBoost gets the rest)
+BLEND_WEIGHTS = [round(w, 1) for w in np.arange(0.0, 1.01, 0.1)]
+
+# A trial is stopped once its running CV AUC trails the best finished trial's
+# running AUC over the same folds by this much
+PRUNE_MARGIN = 0.02
+
+# Fold matrices and the best finished trial's per-fold running AUC, set once per worker process
+_fold_data = None
+_best_running_auc = None
+
+
+def _init_search_worker(X, y, folds, best_running_auc):
+    """Store the fold matrices and shared best scores in the worker process."""
+    global _fold_data, _best_running_auc
+    _fold_data = (X, y, folds)
+    _best_running_auc = best_running_auc
+
+
+def _best_blend(rf_probas, xgb_probas, targets):
+    """Return (rf_weight, mean AUC) of the best blend over the evaluated folds."""
+    best_weight, best_auc = BLEND_WEIGHTS[0], -1.0
+    for rf_weight in BLEND_WEIGHTS:
+        aucs = [
+            roc_auc_score(y_val, rf_weight * rf_proba + (1.0 - rf_weight) * xgb_proba)
+            for rf_proba, xgb_proba, y_val in zip(rf_probas, xgb_probas, targets)
+        ]
+        mean_auc = float(np.mean(aucs))
+        if mean_auc > best_auc:
+            best_weight, best_auc = rf_weight, mean_auc
+    return best_weight, best_auc
+
+
+def run_trial(trial_id: int, params: Dict) -> Dict:
+    """
+    Cross-validate one configuration on the worker's cached folds.
+
+    Args:
+        trial_id: Index of the trial
+        params: EnsemblePredictor hyperparameters
+
+    Returns:
+        Trial record with the best blend weight, mean CV AUC, status and runtime
+    """
+    start = time.perf_counter()
+    X, y, folds = _fold_data
+    record = {'trial': trial_id, **params, 'rf_weight': None, 'cv_auc': None,
+              'folds_completed': 0, 'status': 'completed'}
+
+    try:
+        rf_probas, xgb_probas, targets, running_auc = [], [], [], []
+        for train_idx, val_idx in folds:
+            model = EnsemblePredictor(**params)
+            model.rf_model.set_params(n_jobs=1)
+            model.xgb_model.set_params(n_jobs=1)
+            model.rf_model.fit(X[train_idx], y[train_idx])
+            model.xgb_model.fit(X[train_idx], y[train_idx])
+
+            rf_probas.append(model.rf_model.predict_proba(X[val_idx])[:, 1])
+            xgb_probas.append(model.xgb_model.predict_proba(X[val_idx])[:, 1])
+            targets.append(y[val_idx])
+            record['folds_completed'] += 1
+
+            rf_weight, cv_auc = _best_blend(rf_probas, xgb_probas, targets)
+            record['rf_weight'], record['cv_auc'] = rf_weight, cv_auc
+            running_auc.append(cv_auc)
+
+            # Stop early if this trial can't plausibly catch the best finished one
+            fold = len(targets) - 1
+            if fold < len(folds) - 1 and cv_auc < _best_running_auc[fold] - PRUNE_MARGIN:
+                record['status'] = 'pruned'
+                break
+
+        if record['status'] == 'completed':
+            with _best_running_auc.get_lock():
+                if record['cv_auc'] > _best_running_auc[len(folds) - 1]:
+                    _best_running_auc[:] = running_auc
+
+    except Exception as e:
+        record['status'] = 'failed'
+        record['error'] = str(e)
+
+    record['seconds'] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def search_ensemble_hyperparameters(
+    data: pd.DataFrame,
+    n_trials: int = 20,
+    n_splits: int = 4,
+    test_size: float = 0.2,
+    max_workers: Optional[int] = None,
+    search_space: Optional[Dict[str, List]] = None,
+    random_state: int = 42
+) -> EnsemblePredictor:
+    """
+    Search RF/XGBoost hyperparameters and blend weights with time-ordered CV.
+
+    The most recent `test_size` of matches is held out; the rest is split into
+    expanding-window folds whose matrices are sent to each worker once and
+    shared by all trials. The best configuration is refit on the non-held-out
+    data, evaluated on the holdout and registered with ModelVersionTracker
+    together with the full trial table.
+
+    Args:
+        data: Processed match data
+        n_trials: Number of sampled configurations
+        n_splits: Number of time-ordered CV folds
+        test_size: Fraction of the most recent matches held out for evaluation
+        max_workers: Worker processes (defaults to all cores)
+        search_space: Parameter grid to sample from (defaults to DEFAULT_SEARCH_SPACE)
+        random_state: Seed for parameter sampling
+
+    Returns:
+        Trained ensemble model with the best configuration
+    """
+    from ml.model import build_training_dataset
+
+    search_start = time.perf_counter()
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M")
+    model_version = f"ensemble_search_v{timestamp}"
+
+    dataset = build_training_dataset(data)
+    predictors = list(dataset.predictors)
+    frame = dataset.frame
+    if 'date' in frame.columns:
+        frame = frame.sort_values('date', kind='mergesort')
+
+    n_test = int(len(frame) * test_size)
+    history, holdout = frame.iloc[:len(frame) - n_test], frame.iloc[len(frame) - n_test:]
+
+    X = history[predictors].to_numpy(dtype=np.float64)
+    y = history['target'].to_numpy(dtype=np.int64)
+    folds = [
+        (train_idx, val_idx)
+        for train_idx, val_idx in TimeSeriesSplit(n_splits=n_splits).split(X)
+        if len(np.unique(y[val_idx])) == 2
+    ]
+    if not folds:
+        raise ValueError("Not enough data for time-ordered cross-validation")
+
+    candidates = list(ParameterSampler(search_space or DEFAULT_SEARCH_SPACE, n_iter=n_trials, random_state=random_state))
+    max_workers = max_workers or os.cpu_count() or 1
+    best_running_auc = multiprocessing.Array('d', [-1.0] * len(folds))
+
+    print(f"Running {len(candidates)} trials over {len(folds)} folds with {max_workers} workers...")
+    trials = []
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_search_worker,
+        initargs=(X, y, folds, best_running_auc)
+    ) as executor:
+        futures = [executor.submit(run_trial, trial_id, params) for trial_id, params in enumerate(candidates)]
+        for future in as_completed(futures):
+            record = future.result()
+            trials.append(record)
+            print(f"Trial {record['trial']}: {record['status']}, CV AUC={record['cv_auc']}, {record['seconds']}s")
+
+    trials.sort(key=lambda record: record['trial'])
+    completed = [record for record in trials if record['status'] == 'completed']
+    if not completed:
+        raise RuntimeError("All hyperparameter search trials failed")
+    best = max(completed, key=lambda record: record['cv_auc'])
+    best_params = {name: best[name] for name in candidates[best['trial']]}
+
+    # Refit the best configuration on all non-held-out data
+    model = EnsemblePredictor(
+        **best_params,
+        weights=(best['rf_weight'], round(1.0 - best['rf_weight'], 1)),
+        model_version=model_version,
+        parallel_training=True
+    )
+    model.train(history[predictors], history['target'])
+
+    metrics = {}
+    if len(holdout) > 0 and holdout['target'].nunique() == 2:
+        metrics = model.evaluate(holdout[predictors], holdout['target'])
+    metrics['cv_auc'] = best['cv_auc']
+    metrics['search_seconds'] = time.perf_counter() - search_start
+    print(f"Best trial {best['trial']}: {best_params}, RF weight={best['rf_weight']}, CV AUC={best['cv_auc']:.4f}")
+
+    hyperparameters = dict(model.hyperparams)
+    hyperparameters['search'] = {
+        'n_trials': len(candidates),
+        'n_splits': len(folds),
+        'best_trial': best['trial'],
+        'trials': trials
+    }
+
+    ModelVersionTracker().register_model(
+        model=model,
+        model_type="ensemble",
+        version_name=model_version,
+        description=f"Ensemble model from {len(candidates)}-trial hyperparameter search (CV AUC {best['cv_auc']:.4f})",
+        hyperparameters=hyperparameters,
+        metrics={name: float(value) for name, value in metrics.items()}
+    )
+
+    return model
@@ -4,9 +4,19 @@ import pandas as pd
 import pickle
 import joblib
 import numpy as np
+import hashlib
+from collections import OrderedDict
 from datetime import datetime
+from typing import NamedTuple, Optional, Tuple
 from ml.model_versioning import ModelVersionTracker
 
+# Number of top features kept pre-serialized for prediction responses
+TOP_FEATURES_K = 5
+
+# Number of prepared training datasets kept in memory, keyed by input content hash
+TRAINING_DATASET_CACHE_SIZE = 2
+_training_dataset_cache = OrderedDict()
+
 class FootballPredictionModel:
     def __init__(self, n_estimators=200, min_samples_split=10, model_version="unversioned"):
         self.model = RandomForestClassifier(
@@ -28,6 +38,11 @@ class FootballPredictionModel:
             return self
             
         self.model.fit(X, y)
+        
+        # Importance only changes on refit, so compute it once here
+        self.feature_importance = None
+        self.top_features = None
+        self.get_feature_importance()
         return self
     
     def predict(self, X):
@@ -43,7 +58,11 @@ class FootballPredictionModel:
         return self.model.predict_proba(X)
     
     def get_feature_importance(self):
-        """Return feature importance scores."""
+        """Return feature importance scores (cached after training)."""
+        cached = getattr(self, 'feature_importance', None)
+        if cached is not None:
+            return cached
+        
         if hasattr(self.model, 'feature_importances_'):
             importance = self.model.feature_importances_
             feature_names = self.predictors
@@ -52,10 +71,11 @@ class FootballPredictionModel:
             if len(feature_names) != len(importance):
                 feature_names = [f"Feature_{i}" for i in range(len(importance))]
                 
-            return pd.DataFrame({
+            self.feature_importance = pd.DataFrame({
                 'Feature': feature_names[:len(importance)],
                 'Importance': importance
             }).sort_values('Importance', ascending=False)
+            return self.feature_importance
         
         # Return default feature importance if not trained
         return pd.DataFrame({
@@ -63,6 +83,16 @@ class FootballPredictionModel:
             'Importance': [0.2] * (len(self.predictors) if self.predictors else 1)
         })
     
+    def get_top_features(self, k=TOP_FEATURES_K):
+        """Return the top-k features as a tuple of records, serialized once per fit."""
+        top_features = getattr(self, 'top_features', None)
+        if top_features is None or len(top_features) < k:
+            if not hasattr(self.model, 'feature_importances_'):
+                return tuple(self.get_feature_importance().head(k).to_dict('records'))
+            top_features = tuple(self.get_feature_importance().head(max(k, TOP_FEATURES_K)).to_dict('records'))
+            self.top_features = top_features
+        return top_features[:k]
+    
     def save_model(self, filepath):
         """Save trained model to file."""
         joblib.dump(self, filepath)
@@ -76,10 +106,113 @@ class FootballPredictionModel:
             print(f"Could not load model from {filepath}, creating new model")
             return cls()
 
+class TrainingDataset(NamedTuple):
+    """Prepared training matrix and the predictors the trainers fit on."""
+    frame: pd.DataFrame
+    predictors: Tuple[str, ...]
+    content_hash: Optional[str]
+
+def hash_training_frame(data):
+    """Return a content hash of a DataFrame, or None if it can't be hashed."""
+    try:
+        digest = hashlib.sha1()
+        digest.update(repr([(str(col), str(dtype)) for col, dtype in data.dtypes.items()]).encode())
+        digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+        return digest.hexdigest()
+    except Exception as e:
+        print(f"Could not hash training data, skipping dataset cache: {e}")
+        return None
+
+def clear_training_dataset_cache():
+    """Drop all cached training datasets, e.g. once a training job has finished."""
+    _training_dataset_cache.clear()
+
+def build_training_dataset(data):
+    """
+    Prepare the training matrix used by both trainers.
+    
+    Discovers predictors, patches missing columns, creates the target, drops
+    incomplete rows and adds the advanced features. The input frame is left
+    unchanged, and the result is cached by its content hash so that training
+    again on unchanged data skips preparation. Every call gets its own copy
+    of the cached frame, so a trainer modifying it can't affect the next one.
+    Long-lived processes should call clear_training_dataset_cache() when a
+    training job is done.
+    """
+    from preprocessing.data_processing import add_advanced_features, augment_data
+    
+    content_hash = hash_training_frame(data)
+    if content_hash is not None and content_hash in _training_dataset_cache:
+        _training_dataset_cache.move_to_end(content_hash)
+        print("Reusing prepared training dataset")
+        dataset = _training_dataset_cache[content_hash]
+        return dataset._replace(frame=dataset.frame.copy())
+    
+    # Shallow copy: added columns don't leak into the caller's frame
+    data = data.copy(deep=False)
+    
+    # Define predictors
+    basic_predictors = ['venue_code', 'opp_code', 'hour', 'day_code']
+    
+    # Get available rolling predictors
+    rolling_predictors = [col for col in data.columns if '_rolling' in col]
+    
+    # If no rolling predictors are found, use defaults
+    if not rolling_predictors:
+        print("No rolling predictors found, adding defaults")
+        rolling_predictors = ['gf_rolling', 'ga_rolling', 'sh_rolling', 'sot_rolling']
+        # Add default values for missing columns
+        for col in rolling_predictors:
+            if col not in data.columns:
+                base_col = col.split('_')[0]
+                if base_col in data.columns:
+                    data[col] = data[base_col]
+                else:
+                    default_values = {'gf': 1.5, 'ga': 1.0, 'sh': 12.0, 'sot': 5.0}
+                    data[col] = default_values.get(base_col, 1.0)
+    
+    all_predictors = basic_predictors + rolling_predictors
+    
+    # Ensure all predictors exist in the data
+    for predictor in all_predictors:
+        if predictor not in data.columns:
+            print(f"Adding missing predictor: {predictor}")
+            if predictor == 'venue_code':
+                data[predictor] = data['venue'].map({'Home': 1, 'Away': 0}) if 'venue' in data.columns else 1
+            elif predictor == 'opp_code':
+                data[predictor] = 0
+            elif predictor == 'hour':
+                data[predictor] = 15
+            elif predictor == 'day_code':
+                data[predictor] = 0
+            else:
+                data[predictor] = 1.0
+    
+    # Ensure target column exists
+    if 'target' not in data.columns:
+        print("Creating target column")
+        data['target'] = data['result'].map({'W': 1, 'D': 0, 'L': 0}) if 'result' in data.columns else 0
+    
+    # Filter valid data
+    valid_data = data.dropna(subset=all_predictors + ['target'])
+    valid_data = add_advanced_features(valid_data, copy=False)
+    
+    if len(valid_data) < 100:  # If we have fewer than 100 samples
+        print(f"Augmenting data from {len(valid_data)} to {len(valid_data) + 50} samples")
+        valid_data = augment_data(valid_data, n_samples=50)
+    
+    dataset = TrainingDataset(frame=valid_data, predictors=tuple(all_predictors), content_hash=content_hash)
+    
+    if content_hash is not None:
+        _training_dataset_cache[content_hash] = dataset
+        while len(_training_dataset_cache) > TRAINING_DATASET_CACHE_SIZE:
+            _training_dataset_cache.popitem(last=False)
+    
+    return dataset._replace(frame=valid_data.copy())
+
 def train_prediction_model(data, train_date_cutoff='2023-01-01'):
     """Train the football prediction model with enhanced error handling, features, and versioning."""
     print("Training prediction model...")
-    from preprocessing.data_processing import add_advanced_features
     from sklearn.model_selection import train_test_split
     
     # Create version tracker
@@ -107,57 +240,11 @@ def train_prediction_model(data, train_date_cutoff='2023-01-01'):
         return model
     
     try:
-        # Define predictors
-        basic_predictors = ['venue_code', 'opp_code', 'hour', 'day_code']
-        
-        # Get available rolling predictors
-        rolling_predictors = [col for col in data.columns if '_rolling' in col]
-        
-        # If no rolling predictors are found, use defaults
-        if not rolling_predictors:
-            print("No rolling predictors found, adding defaults")
-            rolling_predictors = ['gf_rolling', 'ga_rolling', 'sh_rolling', 'sot_rolling']
-            # Add default values for missing columns
-            for col in rolling_predictors:
-                if col not in data.columns:
-                    base_col = col.split('_')[0]
-                    if base_col in data.columns:
-                        data[col] = data[base_col]
-                    else:
-                        default_values = {'gf': 1.5, 'ga': 1.0, 'sh': 12.0, 'sot': 5.0}
-                        data[col] = default_values.get(base_col, 1.0)
-        
-        all_predictors = basic_predictors + rolling_predictors
-        
-        # Ensure all predictors exist in the data
-        for predictor in all_predictors:
-            if predictor not in data.columns:
-                print(f"Adding missing predictor: {predictor}")
-                if predictor == 'venue_code':
-                    data[predictor] = data['venue'].map({'Home': 1, 'Away': 0}) if 'venue' in data.columns else 1
-                elif predictor == 'opp_code':
-                    data[predictor] = 0
-                elif predictor == 'hour':
-                    data[predictor] = 15
-                elif predictor == 'day_code':
-                    data[predictor] = 0
-                else:
-                    data[predictor] = 1.0
-        
-        # Ensure target column exists
-        if 'target' not in data.columns:
-            print("Creating target column")
-            data['target'] = data['result'].map({'W': 1, 'D': 0, 'L': 0}) if 'result' in data.columns else 0
+        # Shared, cached preparation of the training matrix
+        dataset = build_training_dataset(data)
+        all_predictors = list(dataset.predictors)
+        valid_data = dataset.frame
         
-        # Filter valid data
-        valid_data = data.dropna(subset=all_predictors + ['target'])
-        valid_data = add_advanced_features(valid_data)
-        
-        if len(valid_data) < 100:  # If we have fewer than 100 samples
-            from preprocessing.data_processing import augment_data
-            print(f"Augmenting data from {len(valid_data)} to {len(valid_data) + 50} samples")
-            valid_data = augment_data(valid_data, n_samples=50)
-            
         if len(valid_data) == 0:
             print("No valid data after filtering, creating default model")
             model = FootballPredictionModel(model_version=f"default_rf_{timestamp}")
@@ -251,56 +338,108 @@ def train_prediction_model(data, train_date_cutoff='2023-01-01'):
         
         return model
 
-def prepare_match_prediction_data(match_details, historical_data):
+def prepare_match_prediction_data(match_details, historical_data, feature_index=None):
     """Prepare a single match data for prediction."""
-    # Create a DataFrame with the match details
-    match_df = pd.DataFrame([match_details])
-    
+    return prepare_batch_prediction_data([match_details], historical_data, feature_index)
+
+def prepare_batch_prediction_data(match_details_list, historical_data, feature_index=None):
+    """
+    Prepare many matches for prediction as a single feature matrix.
+
+    One row per entry of match_details_list and in the same order, so the
+    whole list can be scored with one predict_proba call. Any *_rolling
+    values in the match details are passed through as columns.
+    """
+    match_df = pd.DataFrame(list(match_details_list))
+    if match_df.empty:
+        return match_df
+
     # Encode venue
-    match_df['venue_code'] = 1 if match_details['venue'] == 'Home' else 0
-    
-    # Get team and opponent codes
-    if historical_data is not None and 'team_code' in historical_data.columns and 'team' in historical_data.columns:
-        try:
-            team_codes = historical_data.drop_duplicates('team')[['team', 'team_code']]
-            team_code_map = dict(zip(team_codes['team'], team_codes['team_code']))
-            
-            match_df['team_code'] = team_code_map.get(match_details['team'], 0)
-            match_df['opp_code'] = team_code_map.get(match_details['opponent'], 0)
-        except:
-            match_df['team_code'] = 0
-            match_df['opp_code'] = 0
-    else:
-        match_df['team_code'] = 0
-        match_df['opp_code'] = 0
-    
+    match_df['venue_code'] = (match_df['venue'] == 'Home').astype(int)
+
+    # Get team and opponent codes (the lookup is built once for the whole batch)
+    team_code_map = {}
+    if feature_index is not None:
+        # Precomputed lookup, no scan of the historical data
+        team_code_map = feature_index.team_codes
+    elif historical_data is not None and 'team_code' in historical_data.columns and 'team' in historical_data.columns:
+        team_codes = historical_data.drop_duplicates('team')[['team', 'team_code']]
+        team_code_map = dict(zip(team_codes['team'], team_codes['team_code']))
+
+    match_df['team_code'] = match_df['team'].map(team_code_map).fillna(0).astype(int)
+    match_df['opp_code'] = match_df['opponent'].map(team_code_map).fillna(0).astype(int)
+
     # Extract hour and day code
-    try:
-        if isinstance(match_details['date'], pd.Timestamp):
-            match_df['day_code'] = match_details['date'].dayofweek
-        else:
-            match_df['day_code'] = pd.Timestamp(match_details['date']).dayofweek
-    except:
-        match_df['day_code'] = 0
-    
-    try:
-        if 'time' in match_details:
-            match_df['hour'] = int(match_details['time'].split(':')[0])
-        elif 'hour' in match_details:
-            match_df['hour'] = match_details['hour']
-        else:
-            match_df['hour'] = 15  # Default to 3 PM
-    except:
-        match_df['hour'] = 15
-    
-    # Add all rolling averages from match_details if present
-    for key, value in match_details.items():
-        if '_rolling' in key and key not in match_df.columns:
-            match_df[key] = value
-    
+    dates = pd.to_datetime(match_df['date'], errors='coerce', format='mixed')
+    match_df['day_code'] = dates.dt.dayofweek.fillna(0).astype(int)
+
+    # An explicit hour wins; otherwise take it from the kick-off time
+    hours = pd.to_numeric(match_df['hour'], errors='coerce') if 'hour' in match_df.columns else pd.Series(np.nan, index=match_df.index)
+    if 'time' in match_df.columns:
+        time_hours = pd.to_numeric(match_df['time'].astype(str).str.split(':').str[0], errors='coerce')
+        hours = hours.fillna(time_hours)
+    match_df['hour'] = hours.fillna(15).astype(int)  # Default to 3 PM
+
     return match_df
 
-def train_ensemble_model(data, train_date_cutoff='2023-01-01', rf_weight=0.7, xgb_weight=0.3):
+def load_latest_model(model_type, data=None, max_candidates=5):
+    """
+    Load the most recent registered model of a type that can serve the given data.
+
+    Walks back through the latest registered versions and returns the first one
+    that loads, is a trained model of the expected class and whose predictors are
+    all present in data.
+
+    Args:
+        model_type: 'randomforest' or 'ensemble'
+        data: Processed match data the model will serve (skips the predictor check if None)
+        max_candidates: Number of recent versions to try before giving up
+
+    Returns:
+        The loaded model or None if no compatible artifact exists
+    """
+    from ml.ensemble_model import EnsemblePredictor
+
+    expected_classes = {
+        'randomforest': FootballPredictionModel,
+        'ensemble': EnsemblePredictor,
+    }
+    expected_class = expected_classes.get(model_type)
+    if expected_class is None:
+        print(f"Unknown model type: {model_type}")
+        return None
+
+    try:
+        version_tracker = ModelVersionTracker()
+        versions = version_tracker.get_model_versions(model_type)[:max_candidates]
+    except Exception as e:
+        print(f"Could not read registered {model_type} versions: {e}")
+        return None
+
+    for version in versions:
+        version_name = version['version_name']
+        model = version_tracker.load_model(version_name=version_name)
+
+        if not isinstance(model, expected_class):
+            continue
+
+        # Skip untrained default/fallback models
+        trained = model.model if model_type == 'randomforest' else model.rf_model
+        if not hasattr(trained, 'classes_'):
+            continue
+
+        if data is not None and not model.predictors:
+            continue
+        if data is not None and any(p not in data.columns for p in model.predictors):
+            print(f"Skipping {version_name}: predictors don't match the loaded data")
+            continue
+
+        return model
+
+    return None
+
+def train_ensemble_model(data, train_date_cutoff='2023-01-01', rf_weight=0.7, xgb_weight=0.3, parallel_training=True,
+                         hyperparameter_search=False, search_options=None):
     """
     Train the ensemble football prediction model combining RandomForest and XGBoost.
     
@@ -309,12 +448,16 @@ def train_ensemble_model(data, train_date_cutoff='2023-01-01', rf_weight=0.7, xg
         train_date_cutoff: Date to split training/testing data
         rf_weight: Weight for RandomForest model (between 0 and 1)
         xgb_weight: Weight for XGBoost model (between 0 and 1)
+        parallel_training: Fit the RandomForest and XGBoost members concurrently
+        hyperparameter_search: Pick hyperparameters and blend weights with a
+            cross-validated search (see ml.hyperparameter_search)
+        search_options: Keyword arguments for search_ensemble_hyperparameters,
+            e.g. n_trials and n_splits
         
     Returns:
         Trained ensemble model
     """
     from ml.ensemble_model import EnsemblePredictor
-    from preprocessing.data_processing import add_advanced_features
     from sklearn.model_selection import train_test_split
     from ml.model_versioning import ModelVersionTracker
     
@@ -345,58 +488,19 @@ def train_ensemble_model(data, train_date_cutoff='2023-01-01', rf_weight=0.7, xg
         
         return model
     
+    if hyperparameter_search:
+        try:
+            from ml.hyperparameter_search import search_ensemble_hyperparameters
+            return search_ensemble_hyperparameters(data, **(search_options or {}))
+        except Exception as e:
+            print(f"Hyperparameter search failed, using default hyperparameters: {e}")
+    
     try:
-        # Define predictors
-        basic_predictors = ['venue_code', 'opp_code', 'hour', 'day_code']
-        
-        # Get available rolling predictors
-        rolling_predictors = [col for col in data.columns if '_rolling' in col]
-        
-        # If no rolling predictors are found, use defaults
-        if not rolling_predictors:
-            print("No rolling predictors found, adding defaults")
-            rolling_predictors = ['gf_rolling', 'ga_rolling', 'sh_rolling', 'sot_rolling']
-            # Add default values for missing columns
-            for col in rolling_predictors:
-                if col not in data.columns:
-                    base_col = col.split('_')[0]
-                    if base_col in data.columns:
-                        data[col] = data[base_col]
-                    else:
-                        default_values = {'gf': 1.5, 'ga': 1.0, 'sh': 12.0, 'sot': 5.0}
-                        data[col] = default_values.get(base_col, 1.0)
-        
-        all_predictors = basic_predictors + rolling_predictors
-        
-        # Ensure all predictors exist in the data
-        for predictor in all_predictors:
-            if predictor not in data.columns:
-                print(f"Adding missing predictor: {predictor}")
-                if predictor == 'venue_code':
-                    data[predictor] = data['venue'].map({'Home': 1, 'Away': 0}) if 'venue' in data.columns else 1
-                elif predictor == 'opp_code':
-                    data[predictor] = 0
-                elif predictor == 'hour':
-                    data[predictor] = 15
-                elif predictor == 'day_code':
-                    data[predictor] = 0
-                else:
-                    data[predictor] = 1.0
-        
-        # Ensure target column exists
-        if 'target' not in data.columns:
-            print("Creating target column")
-            data['target'] = data['result'].map({'W': 1, 'D': 0, 'L': 0}) if 'result' in data.columns else 0
+        # Shared, cached preparation of the training matrix
+        dataset = build_training_dataset(data)
+        all_predictors = list(dataset.predictors)
+        valid_data = dataset.frame
         
-        # Filter valid data
-        valid_data = data.dropna(subset=all_predictors + ['target'])
-        valid_data = add_advanced_features(valid_data)
-        
-        if len(valid_data) < 100:  # If we have fewer than 100 samples
-            from preprocessing.data_processing import augment_data
-            print(f"Augmenting data from {len(valid_data)} to {len(valid_data) + 50} samples")
-            valid_data = augment_data(valid_data, n_samples=50)
-            
         if len(valid_data) == 0:
             print("No valid data after filtering, creating default ensemble model")
             model = EnsemblePredictor(weights=(rf_weight, xgb_weight), model_version=model_version)
@@ -424,7 +528,8 @@ def train_ensemble_model(data, train_date_cutoff='2023-01-01', rf_weight=0.7, xg
             weights=(rf_weight, xgb_weight),
             model_version=model_version,
             xgb_learning_rate=0.05,
-            xgb_max_depth=3
+            xgb_max_depth=3,
+            parallel_training=parallel_training
         )
         
         X_train = train_split[all_predictors]
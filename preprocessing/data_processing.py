@@ -1,6 +1,10 @@
 # preprocessing/data_processing.py
 import pandas as pd
 import numpy as np
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
 
 def load_data(file_path):
     """Load and preprocess the football match data."""
@@ -28,11 +32,23 @@ def load_data(file_path):
         return pd.DataFrame(columns=['date', 'team', 'opponent', 'venue', 'result', 'gf', 'ga', 'sh', 'sot', 'time'])
 # Add this function to preprocessing/data_processing.py
 
-def add_advanced_features(data):
-    """Add advanced features to improve model accuracy"""
-    # Make a copy to avoid modifying the original
-    enhanced_data = data.copy()
+def add_advanced_features(data, copy=True):
+    """
+    Add advanced features to improve model accuracy
+    
+    Pass copy=False when the caller owns `data` and doesn't need it unchanged;
+    it is then sorted and extended in place.
+    """
+    if copy:
+        # Make a copy to avoid modifying the original
+        return _add_advanced_features(data.copy())
     
+    # The caller owns the frame, so pandas' chained-assignment check doesn't apply
+    with pd.option_context('mode.chained_assignment', None):
+        return _add_advanced_features(data)
+
+def _add_advanced_features(enhanced_data):
+    """Add the advanced feature columns to enhanced_data in place and return it."""
     # Add goal difference
     if 'gf' in enhanced_data.columns and 'ga' in enhanced_data.columns:
         enhanced_data['goal_diff'] = enhanced_data['gf'] - enhanced_data['ga']
@@ -44,38 +60,36 @@ def add_advanced_features(data):
     # Calculate team form (recent performance)
     if 'team' in enhanced_data.columns and 'date' in enhanced_data.columns and 'result' in enhanced_data.columns:
         # Sort by date
-        enhanced_data = enhanced_data.sort_values(['team', 'date'])
+        enhanced_data.sort_values(['team', 'date'], inplace=True)
         
         # Create form points (W=3, D=1, L=0)
         enhanced_data['form_points'] = enhanced_data['result'].map({'W': 3, 'D': 1, 'L': 0})
         
         # Calculate rolling form (last 3 matches)
-        enhanced_data['form_3'] = enhanced_data.groupby('team')['form_points'].transform(
-            lambda x: x.rolling(3, min_periods=1).mean()
-        )
+        form_3 = enhanced_data.groupby('team', sort=False, dropna=False)['form_points'].rolling(3, min_periods=1).mean()
+        enhanced_data['form_3'] = np.where(enhanced_data['team'].notna(), form_3.to_numpy(), np.nan)
     
     # Calculate home/away performance
     if 'team' in enhanced_data.columns and 'venue' in enhanced_data.columns and 'result' in enhanced_data.columns:
         # Create win indicator
         enhanced_data['is_win'] = (enhanced_data['result'] == 'W').astype(int)
         
-        # Calculate home win percentage
-        home_win_pct = enhanced_data[enhanced_data['venue'] == 'Home'].groupby('team')['is_win'].mean()
-        home_win_dict = home_win_pct.to_dict()
-        
-        # Calculate away win percentage
+        # Calculate home and away win percentage
+        is_home = enhanced_data['venue'] == 'Home'
+        home_win_pct = enhanced_data[is_home].groupby('team')['is_win'].mean()
         away_win_pct = enhanced_data[enhanced_data['venue'] == 'Away'].groupby('team')['is_win'].mean()
-        away_win_dict = away_win_pct.to_dict()
         
-        # Add to dataframe
-        enhanced_data['team_home_win_pct'] = enhanced_data.apply(
-            lambda row: home_win_dict.get(row['team'], 0.5) if row['venue'] == 'Home' else away_win_dict.get(row['team'], 0.3),
-            axis=1
+        # Add to dataframe, picking the home or away rate by venue
+        enhanced_data['team_home_win_pct'] = np.where(
+            is_home,
+            enhanced_data['team'].map(home_win_pct).fillna(0.5),
+            enhanced_data['team'].map(away_win_pct).fillna(0.3)
         )
         
-        enhanced_data['opp_away_win_pct'] = enhanced_data.apply(
-            lambda row: away_win_dict.get(row['opponent'], 0.3) if row['venue'] == 'Home' else home_win_dict.get(row['opponent'], 0.5),
-            axis=1
+        enhanced_data['opp_away_win_pct'] = np.where(
+            is_home,
+            enhanced_data['opponent'].map(away_win_pct).fillna(0.3),
+            enhanced_data['opponent'].map(home_win_pct).fillna(0.5)
         )
     
     return enhanced_data
@@ -139,6 +153,323 @@ def calculate_rolling_averages(group, cols, new_cols):
                 group[col] = group[col].fillna(group[col].mean())
     
     return group
+def rolling_window_means(df, cols, window=3):
+    """
+    Mean of each stat over the team's previous `window` matches, before any filling.
+
+    Expects df sorted by (team, date) with a RangeIndex; returns a frame of
+    *_rolling columns aligned with df.
+    """
+    new_cols = [f"{col}_rolling" for col in cols]
+    rolling_stats = df[cols].groupby(df['team'], sort=False).rolling(window, closed='left').mean()
+    return pd.DataFrame(rolling_stats.to_numpy(), columns=new_cols, index=df.index)
+
+def compute_rolling_features(df, cols, window=3):
+    """
+    Vectorized equivalent of applying calculate_rolling_averages to every team.
+
+    Sorts once by (team, date), computes the shifted rolling means for all stat
+    columns in a single groupby-rolling pass and fills gaps with per-team means.
+    Output rows are ordered by team then date with a fresh RangeIndex, exactly
+    like the groupby('team').apply version.
+    """
+    # groupby drops rows without a team, keep that behaviour
+    df = df[df['team'].notna()].sort_values(['team', 'date'], kind='mergesort').reset_index(drop=True)
+    new_cols = [f"{col}_rolling" for col in cols]
+    
+    if df.empty or not cols:
+        return df
+    
+    teams = df['team']
+    rolling_values = rolling_window_means(df, cols, window)
+    
+    # Fill NaN values with the team's mean rolling value, or the team's raw stat
+    # mean when the team has no rolling values at all
+    rolling_means = rolling_values.groupby(teams, sort=False).transform('mean')
+    base_means = df[cols].groupby(teams, sort=False).transform('mean')
+    base_means.columns = new_cols
+    fill_values = rolling_means.where(rolling_means.notna(), base_means)
+    
+    df[new_cols] = rolling_values.fillna(fill_values)
+    return df
+
+# Columns added by encode_categorical_features
+DERIVED_COLUMNS = {'team_code', 'venue_code', 'opp_code', 'hour', 'day_code', 'target'}
+
+# Columns that identify a match and its stats when comparing uploads
+MATCH_KEY_COLUMNS = ['date', 'time', 'team', 'opponent', 'venue', 'result']
+STAT_COLUMNS = ['gf', 'ga', 'sh', 'sot', 'dist', 'fk', 'pk', 'pkatt']
+
+class RollingFeatureState:
+    """
+    Incremental version of prepare_model_data for append-only match data.
+    
+    Keeps, per team, the last `window` values of every stat plus running sums
+    for the fill means, so new matches are processed in O(new rows) instead of
+    recomputing the rolling features for the whole history. The prepared data
+    matches a full prepare_model_data run on all rows seen so far (ordered by
+    team then date), up to floating point rounding; verify() checks this.
+    """
+    
+    def __init__(self, window=3):
+        self.window = window
+        self.cols = []
+        self.team_codes = {}
+        
+        # Prepared rows ordered by team then date, and the number of rows of
+        # each team in team order; each team's rows form one contiguous block
+        self._data = None
+        self.team_counts = {}
+        
+        # Per team: last `window` raw values for each stat and the last match date
+        self.history = {}
+        self.last_date = {}
+        
+        # Per team and stat: [sum, count] of non-NaN rolling values and of raw values
+        self.rolling_totals = {}
+        self.base_totals = {}
+        
+        # Per team and stat: offsets within the team's block whose rolling value is a
+        # fill value (new rows go to the end of the block, so offsets never move)
+        self.fill_rows = {}
+        
+        # Input rows seen so far with the hashes of the first and last one, and the
+        # raw columns; sync() uses them to recognise input that only appends matches
+        self.rows_seen = 0
+        self.boundary_hashes = None
+        self.raw_columns = set()
+    
+    @staticmethod
+    def _raw_columns(df):
+        return {col for col in df.columns if col not in DERIVED_COLUMNS and not str(col).endswith('_rolling')}
+    
+    @staticmethod
+    def _row_hashes(df):
+        """Hash each match by its key and stat columns, independent of their dtypes."""
+        keys = df[[col for col in MATCH_KEY_COLUMNS if col in df.columns]].astype(str)
+        stats = df[[col for col in STAT_COLUMNS if col in df.columns]].apply(pd.to_numeric, errors='coerce')
+        return pd.util.hash_pandas_object(pd.concat([keys, stats.astype(float)], axis=1), index=False).to_numpy()
+    
+    def fit(self, df):
+        """Process the full history and initialise the per-team state."""
+        self.__init__(window=self.window)
+        raw_columns = self._raw_columns(df)
+        boundary_hashes = tuple(self._row_hashes(df.iloc[[0, -1]])) if len(df) else None
+        rows_seen = len(df)
+        
+        df = encode_categorical_features(df)
+        self.cols = [col for col in STAT_COLUMNS if col in df.columns]
+        if not self.cols:
+            raise ValueError("No stat columns available for rolling features")
+        
+        teams = sorted(df['team'].dropna().unique())
+        self.team_codes = {team: idx for idx, team in enumerate(teams)}
+        
+        prepared = df[df['team'].notna()].sort_values(['team', 'date'], kind='mergesort').reset_index(drop=True)
+        raw_rolling = rolling_window_means(prepared, self.cols, self.window)
+        
+        # Running totals for the fill means
+        grouped_rolling = raw_rolling.groupby(prepared['team'], sort=False)
+        grouped_base = prepared[self.cols].groupby(prepared['team'], sort=False)
+        rolling_sums, rolling_counts = grouped_rolling.sum(), grouped_rolling.count()
+        base_sums, base_counts = grouped_base.sum(), grouped_base.count()
+        
+        tails = prepared.groupby('team', sort=False).tail(self.window)
+        last_dates = prepared.drop_duplicates('team', keep='last').set_index('team')['date']
+        
+        for team, team_tail in tails.groupby('team', sort=False):
+            self.last_date[team] = last_dates[team]
+            self.history[team] = {col: deque(team_tail[col].tolist(), maxlen=self.window) for col in self.cols}
+            self.rolling_totals[team] = {
+                col: [float(rolling_sums.at[team, f"{col}_rolling"]), int(rolling_counts.at[team, f"{col}_rolling"])]
+                for col in self.cols
+            }
+            self.base_totals[team] = {
+                col: [float(base_sums.at[team, col]), int(base_counts.at[team, col])]
+                for col in self.cols
+            }
+            self.fill_rows[team] = {col: [] for col in self.cols}
+        
+        # prepared is sorted by team, so this is in team order
+        self.team_counts = prepared.groupby('team', sort=False).size().to_dict()
+        
+        # Remember which rows hold fill values so they can be refreshed later
+        team_values = prepared['team'].to_numpy()
+        offsets = prepared.groupby('team', sort=False).cumcount().to_numpy()
+        for col in self.cols:
+            for row in np.flatnonzero(raw_rolling[f"{col}_rolling"].isna().to_numpy()):
+                self.fill_rows[team_values[row]][col].append(offsets[row])
+        
+        # Fill values for the initial history, same as compute_rolling_features
+        rolling_means = grouped_rolling.transform('mean')
+        base_means = grouped_base.transform('mean')
+        base_means.columns = raw_rolling.columns
+        filled = raw_rolling.fillna(rolling_means.where(rolling_means.notna(), base_means))
+        prepared[list(raw_rolling.columns)] = filled.to_numpy(dtype=float)
+        
+        self._data = prepared
+        self.rows_seen = rows_seen
+        self.boundary_hashes = boundary_hashes
+        self.raw_columns = raw_columns
+        return self._data
+    
+    def update(self, new_rows):
+        """
+        Append new matches and return them with their features.
+        
+        Fill values of earlier rows for the affected teams are refreshed in
+        place. Raises ValueError when the rows can't be applied incrementally
+        (new teams or matches dated before a team's latest match); rebuild
+        with fit() in that case.
+        """
+        if new_rows.empty:
+            return new_rows
+        
+        n_input_rows = len(new_rows)
+        last_hash = self._row_hashes(new_rows.iloc[[-1]])[0]
+        new_rows = new_rows.copy()
+        if 'date' in new_rows.columns:
+            new_rows['date'] = pd.to_datetime(new_rows['date'])
+        if 'time' not in new_rows.columns:
+            new_rows['time'] = '15:00'
+        
+        unknown = set(new_rows['team'].dropna()) - set(self.team_codes)
+        if unknown:
+            raise ValueError(f"New teams require a full recompute: {sorted(unknown)}")
+        
+        new_rows = encode_categorical_features(new_rows)
+        new_rows['team_code'] = new_rows['team'].map(self.team_codes)
+        new_rows['opp_code'] = new_rows['opponent'].map(self.team_codes)
+        new_rows = new_rows[new_rows['team'].notna()].sort_values(['team', 'date'], kind='mergesort').reset_index(drop=True)
+        
+        for team, date in new_rows.groupby('team', sort=False)['date'].min().items():
+            if pd.isna(date) or pd.isna(self.last_date[team]) or date < self.last_date[team]:
+                raise ValueError(f"Match for {team} on {date} is not after its latest match; full recompute required")
+        
+        rolling_values = np.full((len(new_rows), len(self.cols)), np.nan)
+        
+        teams = new_rows['team'].tolist()
+        dates = new_rows['date'].tolist()
+        stats = new_rows[self.cols].to_numpy(dtype=float)
+        added = {}
+        
+        for row, team in enumerate(teams):
+            offset = self.team_counts[team] + added.get(team, 0)
+            added[team] = added.get(team, 0) + 1
+            for j, col in enumerate(self.cols):
+                history = self.history[team][col]
+                if len(history) == self.window and not any(pd.isna(v) for v in history):
+                    value = sum(history) / self.window
+                    rolling_values[row, j] = value
+                    self.rolling_totals[team][col][0] += value
+                    self.rolling_totals[team][col][1] += 1
+                else:
+                    self.fill_rows[team][col].append(offset)
+                
+                if not np.isnan(stats[row, j]):
+                    self.base_totals[team][col][0] += stats[row, j]
+                    self.base_totals[team][col][1] += 1
+                history.append(stats[row, j])
+            
+            self.last_date[team] = dates[row]
+        
+        for j, col in enumerate(self.cols):
+            new_rows[f"{col}_rolling"] = rolling_values[:, j]
+        positions = self._insert(new_rows)
+        self._refill(set(teams))
+        
+        self.rows_seen += n_input_rows
+        self.boundary_hashes = (self.boundary_hashes[0], last_hash)
+        return self._data.iloc[positions].reset_index(drop=True)
+    
+    def _team_starts(self):
+        """Position of each team's first row in the prepared data."""
+        counts = np.fromiter(self.team_counts.values(), dtype=np.int64, count=len(self.team_counts))
+        return dict(zip(self.team_counts, np.concatenate([[0], np.cumsum(counts)[:-1]])))
+    
+    def _insert(self, new_rows):
+        """
+        Merge rows sorted by team then date into the prepared data.
+        
+        Each row goes to the end of its team's block, so the merge is one
+        linear take instead of a sort. Returns the new rows' positions.
+        """
+        n_old = len(self._data)
+        ends = {team: start + self.team_counts[team] for team, start in self._team_starts().items()}
+        insert_at = new_rows['team'].map(ends).to_numpy(dtype=np.int64)
+        order = np.insert(np.arange(n_old), insert_at, np.arange(n_old, n_old + len(new_rows)))
+        
+        combined = pd.concat([self._data, new_rows], ignore_index=True)
+        self._data = combined.take(order).reset_index(drop=True)
+        for team, count in new_rows['team'].value_counts().items():
+            self.team_counts[team] += count
+        return np.flatnonzero(order >= n_old)
+    
+    def sync(self, df):
+        """
+        Bring the state up to date with the full match history and return the prepared data.
+        
+        When df is the history seen so far plus new matches, only the rows
+        after the ones already seen are processed, with update(). The
+        history is recognised by its row count, raw columns and the hashes of
+        its first and last row, so checking it doesn't touch the other rows.
+        Anything else (fewer rows, changed columns or boundary rows, new
+        teams, matches dated before a team's latest match) is rebuilt with
+        fit().
+        """
+        if self._data is None:
+            return self.fit(df)
+        
+        if (len(df) < self.rows_seen or self._raw_columns(df) != self.raw_columns
+                or tuple(self._row_hashes(df.iloc[[0, self.rows_seen - 1]])) != self.boundary_hashes):
+            logger.info("Match history changed, recomputing rolling features")
+            return self.fit(df)
+        
+        if len(df) == self.rows_seen:
+            return self.data
+        
+        try:
+            self.update(df.iloc[self.rows_seen:])
+        except ValueError as e:
+            logger.info(f"Recomputing rolling features: {e}")
+            return self.fit(df)
+        return self.data
+    
+    def _refill(self, teams):
+        """Write the current fill value into every filled row of the given teams."""
+        starts = self._team_starts()
+        for team in teams:
+            for j, col in enumerate(self.cols):
+                offsets = self.fill_rows[team][col]
+                if not offsets:
+                    continue
+                
+                rolling_sum, rolling_count = self.rolling_totals[team][col]
+                base_sum, base_count = self.base_totals[team][col]
+                if rolling_count:
+                    fill_value = rolling_sum / rolling_count
+                elif base_count:
+                    fill_value = base_sum / base_count
+                else:
+                    fill_value = np.nan
+                
+                column = self._data.columns.get_loc(f"{col}_rolling")
+                self._data.iloc[starts[team] + np.asarray(offsets), column] = fill_value
+    
+    @property
+    def data(self):
+        """All prepared rows seen so far, ordered by team then date."""
+        return self._data
+    
+    def verify(self, atol=1e-9):
+        """Check the incremental features against a full recompute of the same rows."""
+        data = self.data
+        full = compute_rolling_features(data.drop(columns=[f"{col}_rolling" for col in self.cols]), self.cols, self.window)
+        for col in self.cols:
+            if not np.allclose(data[f"{col}_rolling"], full[f"{col}_rolling"], atol=atol, rtol=0, equal_nan=True):
+                return False
+        return True
+
 # Add this to preprocessing/data_processing.py
 def augment_data(data, n_samples=50):
     """Generate additional data based on existing patterns"""
@@ -182,16 +513,9 @@ def prepare_model_data(df):
                 df[col] = df['result'].map({'W': 2.0, 'D': 1.0, 'L': 0.5})  # Default values
         available_cols = ['gf', 'ga', 'sh', 'sot']
     
-    # Calculate rolling average column names
-    new_cols = [f"{c}_rolling" for c in available_cols]
-    
-    # Group by team and apply rolling averages
+    # Calculate rolling averages for all teams in one vectorized pass
     try:
-        matches_rolling = df.groupby('team').apply(
-            lambda x: calculate_rolling_averages(x, available_cols, new_cols)
-        )
-        matches_rolling = matches_rolling.droplevel('team')
-        matches_rolling.index = range(matches_rolling.shape[0])
+        matches_rolling = compute_rolling_features(df, available_cols)
     except Exception as e:
         print(f"Error calculating rolling averages: {e}")
         # Add basic rolling average columns with default values
@@ -204,4 +528,26 @@ def prepare_model_data(df):
                 df[col] = default_values.get(base_col, 1.0)
         matches_rolling = df
     
-    return matches_rolling
\ No newline at end of file
+    return matches_rolling
+
+def prepare_model_data_incremental(df, state=None):
+    """
+    prepare_model_data that reuses the rolling features of an earlier run.
+    
+    Pass the RollingFeatureState returned by the previous call; matches
+    appended since then are processed incrementally, anything else triggers a
+    full recompute. Returns (processed_data, state); state is None when the
+    data can't be prepared incrementally and prepare_model_data was used.
+    """
+    if df.empty:
+        return prepare_model_data(df), None
+    
+    state = state if state is not None else RollingFeatureState()
+    try:
+        processed_data = state.sync(df)
+    except Exception as e:
+        logger.warning(f"Incremental rolling features unavailable: {e}")
+        return prepare_model_data(df), None
+    
+    # Callers may modify the result, the state keeps its own copy
+    return processed_data.copy(), state
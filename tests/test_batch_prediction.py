@@ -0,0 +1,99 @@
+import asyncio
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from api import main
+
+PREDICTORS = ["venue_code", "opp_code", "hour", "day_code", "gf_rolling", "ga_rolling",
+              "sh_rolling", "sot_rolling", "dist_rolling"]
+
+
+class StubEnsemble:
+    """Minimal stand-in for EnsemblePredictor wrapping a fitted forest."""
+
+    model_version = "test"
+
+    def __init__(self):
+        rng = np.random.RandomState(0)
+        X = pd.DataFrame(rng.rand(200, len(PREDICTORS)) * 20, columns=PREDICTORS)
+        y = (X["gf_rolling"] > X["ga_rolling"]).astype(int)
+        self.predictors = PREDICTORS
+        self.model = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, y)
+
+    def predict_proba(self, X):
+        return self.model.predict_proba(X)
+
+    def get_top_features(self, n):
+        return []
+
+
+@pytest.fixture
+def ensemble(monkeypatch):
+    model = StubEnsemble()
+    monkeypatch.setattr(main.app.state, "ensemble_model", model, raising=False)
+    monkeypatch.setattr(main.app.state, "model", None, raising=False)
+    monkeypatch.setattr(main.app.state, "processed_data", None, raising=False)
+    monkeypatch.setattr(main.app.state, "feature_index", None, raising=False)
+    return model
+
+
+def make_fixtures():
+    base = {"home_team": "Arsenal", "away_team": "Chelsea", "match_date": "2023-03-04",
+            "match_time": "15:00", "goals_for": 2, "goals_against": 1, "shots": 14,
+            "shots_on_target": 6}
+    # Only some fixtures carry distance, so the batch matrix has missing values
+    return [dict(base, goals_for=i % 4, team_to_predict="home" if i % 2 else "away",
+                 distance=17.0 if i % 3 else None) for i in range(12)]
+
+
+def test_batch_matches_single_prediction(ensemble):
+    fixtures = make_fixtures()
+    batch = main.score_fixture_batch(fixtures, ensemble, None, None)
+
+    for fixture, result in zip(fixtures, batch):
+        single = asyncio.run(main.predict_match_ensemble(fixture))
+        assert single["model_version"] == ensemble.model_version
+        assert result["win_probability"] == pytest.approx(single["win_probability"], abs=1e-12)
+
+
+def test_stream_marks_failed_chunk(ensemble, monkeypatch):
+    fixtures = make_fixtures()
+    monkeypatch.setattr(main, "BATCH_CHUNK_SIZE", 5)
+    original = main.score_fixture_batch
+
+    def failing_second_chunk(chunk, *args, **kwargs):
+        if chunk[0] is fixtures[5]:
+            raise RuntimeError("boom")
+        return original(chunk, *args, **kwargs)
+
+    monkeypatch.setattr(main, "score_fixture_batch", failing_second_chunk)
+    lines = [json.loads(line) for line in main.stream_fixture_batch(fixtures, ensemble, None, None)]
+
+    assert [line["index"] for line in lines] == list(range(len(fixtures)))
+    assert all(line["error"] == "boom" for line in lines[5:10])
+    assert all("win_probability" in line for line in lines[:5] + lines[10:])
+
+
+def test_single_and_batch_prepare_identical_rows():
+    from ml.model import prepare_batch_prediction_data, prepare_match_prediction_data
+
+    details = [
+        {"team": "Arsenal", "opponent": "Chelsea", "venue": "Home", "date": "2023-03-04", "time": "20:00"},
+        {"team": "Chelsea", "opponent": "Arsenal", "venue": "Away", "date": pd.Timestamp("2023-03-05"), "hour": 12},
+        {"team": "Everton", "opponent": "Fulham", "venue": "Home", "date": "05/03/2023", "time": "17:30",
+         "hour": 18, "gf_rolling": 1.5},
+        {"team": "Fulham", "opponent": "Everton", "venue": "Away", "date": "not a date"},
+    ]
+    history = pd.DataFrame({"team": ["Arsenal", "Chelsea", "Everton"], "team_code": [0, 1, 2]})
+
+    batch = prepare_batch_prediction_data(details, history)
+
+    assert batch["hour"].tolist() == [20, 12, 18, 15]
+    for i, match_details in enumerate(details):
+        single = prepare_match_prediction_data(match_details, history)
+        expected = batch.iloc[[i]].dropna(axis=1, how="all").reset_index(drop=True)
+        pd.testing.assert_frame_equal(single[expected.columns], expected, check_dtype=False)
@@ -0,0 +1,116 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml.ensemble_model import EnsemblePredictor
+
+
+@pytest.fixture
+def training_data():
+    rng = np.random.RandomState(0)
+    X = pd.DataFrame(rng.rand(120, 4), columns=["venue_code", "hour", "gf_rolling", "ga_rolling"])
+    y = (X["gf_rolling"] > X["ga_rolling"]).astype(int)
+    return X, y
+
+
+@pytest.mark.parametrize("parallel_training", [True, False])
+def test_training_core_budget_does_not_leak_into_pickled_members(training_data, parallel_training):
+    X, y = training_data
+    model = EnsemblePredictor(rf_n_estimators=5, xgb_n_estimators=5,
+                              parallel_training=parallel_training, n_jobs=2)
+    model.train(X, y)
+
+    restored = pickle.loads(pickle.dumps(model))
+
+    assert restored.rf_model.n_jobs is None
+    assert restored.xgb_model.n_jobs is None
+    assert restored.predict_proba(X).shape == (len(X), 2)
+
+
+@pytest.mark.parametrize("bad_value", [np.nan, np.inf, 1e300])
+def test_compiled_backend_rejects_non_finite_input_like_sklearn(training_data, bad_value):
+    X, y = training_data
+    model = EnsemblePredictor(rf_n_estimators=5, xgb_n_estimators=5).train(X, y)
+    X_bad = X.head(3).copy()
+    X_bad.iloc[1, 2] = bad_value
+
+    errors = []
+    for backend in ("sklearn", "compiled"):
+        model.set_inference_backend(backend)
+        with pytest.raises(ValueError) as excinfo:
+            model.predict_proba(X_bad)
+        errors.append(str(excinfo.value))
+
+    assert errors[0] == errors[1]
+
+
+def make_processed_matches(n_rounds=40, seed=0):
+    from preprocessing.data_processing import prepare_model_data
+
+    rng = np.random.RandomState(seed)
+    teams = ["Arsenal", "Chelsea", "Everton", "Fulham"]
+    rows = []
+    for i in range(n_rounds):
+        for j, team in enumerate(teams):
+            gf, ga = rng.randint(0, 4, size=2)
+            rows.append({"date": pd.Timestamp("2022-08-01") + pd.Timedelta(days=7 * i), "time": "15:00",
+                         "team": team, "opponent": teams[(j + i % 3 + 1) % len(teams)],
+                         "venue": "Home" if (i + j) % 2 else "Away",
+                         "result": "W" if gf > ga else ("D" if gf == ga else "L"),
+                         "gf": gf, "ga": ga, "sh": rng.randint(5, 20), "sot": rng.randint(0, 8)})
+    return prepare_model_data(pd.DataFrame(rows))
+
+
+def test_hyperparameter_search_records_best_config_and_trials(tmp_path, monkeypatch):
+    from ml import model as model_module
+    from ml.model_versioning import ModelVersionTracker
+
+    registered = []
+    monkeypatch.setattr(ModelVersionTracker, "register_model",
+                        lambda self, model, model_type, **kwargs: registered.append((model, model_type, kwargs)))
+    (tmp_path / "run").mkdir()
+    monkeypatch.chdir(tmp_path / "run")
+    data = make_processed_matches()
+
+    model = model_module.train_ensemble_model(
+        data, hyperparameter_search=True, search_options={"n_trials": 2, "n_splits": 2, "max_workers": 1}
+    )
+
+    [(recorded_model, model_type, kwargs)] = registered
+    search = kwargs["hyperparameters"]["search"]
+    assert recorded_model is model and model_type == "ensemble"
+    assert model.model_version.startswith("ensemble_search_v")
+    assert search["n_trials"] == 2 and search["n_splits"] == 2
+    assert [trial["trial"] for trial in search["trials"]] == [0, 1]
+    assert all(trial["folds_completed"] >= 1 for trial in search["trials"])
+
+    best = search["trials"][search["best_trial"]]
+    assert best["status"] == "completed"
+    assert best["cv_auc"] == max(t["cv_auc"] for t in search["trials"] if t["status"] == "completed")
+    assert kwargs["metrics"]["cv_auc"] == best["cv_auc"]
+    for name in ("rf_n_estimators", "rf_min_samples_split", "xgb_n_estimators", "xgb_learning_rate", "xgb_max_depth"):
+        assert model.hyperparams[name] == best[name]
+    assert model.weights[0] == best["rf_weight"]
+
+
+def test_cached_training_dataset_is_not_shared_between_calls():
+    from ml import model as model_module
+
+    data = make_processed_matches()
+    model_module.clear_training_dataset_cache()
+    try:
+        first = model_module.build_training_dataset(data)
+        expected = first.frame.copy()
+        first.frame.loc[:, "target"] = -1
+        first.frame.drop(index=first.frame.index[:10], inplace=True)
+
+        second = model_module.build_training_dataset(data)
+        third = model_module.build_training_dataset(data)
+    finally:
+        model_module.clear_training_dataset_cache()
+
+    assert second.content_hash == first.content_hash
+    pd.testing.assert_frame_equal(second.frame, expected)
+    assert second.frame is not third.frame
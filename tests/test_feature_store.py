@@ -0,0 +1,83 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_pipeline.processors.feature_store import FeatureStore
+
+logging.disable(logging.INFO)
+
+
+def make_matches(seasons, leagues, n=400, seed=0):
+    rng = np.random.RandomState(seed)
+    teams = np.array([f"T{i}" for i in range(8)], dtype=object)
+    team = rng.randint(0, 8, n)
+    opponent = (team + rng.randint(1, 8, n)) % 8
+    df = pd.DataFrame({
+        "team": teams[team],
+        "opponent": teams[opponent],
+        "date": pd.Timestamp("2021-08-01") + pd.to_timedelta(rng.randint(0, 600, n), unit="D"),
+        "venue": rng.choice(["Home", "Away"], n),
+        "goals_for": rng.randint(0, 4, n),
+        "goals_against": rng.randint(0, 4, n),
+        "season": rng.choice(seasons, n),
+        "league": rng.choice(leagues, n),
+    })
+    df["result"] = np.where(df.goals_for > df.goals_against, "W",
+                            np.where(df.goals_for == df.goals_against, "D", "L"))
+    return df
+
+
+@pytest.mark.parametrize("seasons,target", [([2022, 2023], 2023), (["2021/2022", "2022/2023"], "2022/2023")])
+def test_filters_match_original_partition_values(tmp_path, seasons, target):
+    matches = make_matches(seasons, ["EPL", "La Liga"])
+    store = FeatureStore(str(tmp_path))
+    store.build(matches)
+
+    features = FeatureStore(str(tmp_path)).read(columns=["team"], filters=[("season", "=", target)])
+
+    assert len(features) == (matches["season"] == target).sum()
+    assert features["season"].dtype == matches["season"].dtype
+    assert set(features["season"]) == {target}
+
+
+def test_string_filter_matches_integer_partition(tmp_path):
+    matches = make_matches([2022, 2023], ["EPL"])
+    store = FeatureStore(str(tmp_path))
+    store.build(matches)
+
+    assert len(store.read(columns=["team"], filters=[("season", "in", ["2022"])])) == (matches["season"] == 2022).sum()
+
+
+def test_build_removes_partitions_missing_from_input(tmp_path):
+    matches = make_matches([2022, 2023], ["EPL", "La Liga"])
+    store = FeatureStore(str(tmp_path))
+    store.build(matches)
+
+    summary = store.build(matches[matches["league"] == "EPL"])
+
+    assert summary["removed"] == ["season=2022/league=La%20Liga", "season=2023/league=La%20Liga"]
+    assert set(store.read(columns=["team"])["league"]) == {"EPL"}
+    assert not os.path.exists(tmp_path / "season=2022" / "league=La%20Liga")
+    assert os.path.exists(tmp_path / "season=2022" / "league=EPL")
+
+
+def test_features_endpoint_reads_the_store(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from api import main
+
+    matches = make_matches([2022, 2023], ["EPL", "La Liga"])
+    FeatureStore(str(tmp_path)).build(matches)
+    monkeypatch.setattr(main, "FEATURE_STORE_PATH", str(tmp_path))
+
+    response = TestClient(main.app).get("/features/", params={"season": "2023", "league": "La Liga",
+                                                              "team": "T1", "columns": "team,points"})
+
+    assert response.status_code == 200
+    rows = response.json()
+    expected = matches[(matches.season == 2023) & (matches.league == "La Liga") & (matches.team == "T1")]
+    assert len(rows) == len(expected)
+    assert {tuple(sorted(row)) for row in rows} == {("league", "points", "season", "team")}
+    assert {row["season"] for row in rows} == {2023}
@@ -0,0 +1,187 @@
+import logging
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from data_pipeline.processors.integrator import FootballDataIntegrator, INTEGRATED_TABLE
+
+logging.disable(logging.INFO)
+
+
+@pytest.fixture
+def integrator(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'football.db'}")
+    return FootballDataIntegrator()
+
+
+@pytest.fixture
+def merged_batches(integrator, monkeypatch):
+    """Record the rows each _merge_rows call writes."""
+    batches = []
+    merge_rows = integrator._merge_rows
+
+    def recording_merge_rows(conn, rows):
+        batches.append(rows.copy())
+        return merge_rows(conn, rows)
+
+    monkeypatch.setattr(integrator, "_merge_rows", recording_merge_rows)
+    return batches
+
+
+def make_integrated(n=20):
+    return pd.DataFrame({
+        "match_id": range(n),
+        "home_team": [f"Home {i % 4}" for i in range(n)],
+        "away_team": [f"Away {i % 5}" for i in range(n)],
+        "home_win_odds": [1.5 + i / 10 for i in range(n)],
+        "condition": ["Rain" if i % 2 else "Sun" for i in range(n)],
+    })
+
+
+def read_table(integrator):
+    return pd.read_sql(f"SELECT * FROM {INTEGRATED_TABLE}", integrator.db_engine).sort_values("match_id")
+
+
+def table_indexes(integrator):
+    with integrator.db_engine.connect() as conn:
+        return [row[0] for row in conn.execute(text(
+            f"SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = '{INTEGRATED_TABLE}'"
+        ))]
+
+
+def test_first_load_creates_table(integrator, merged_batches):
+    data = make_integrated()
+
+    assert integrator._load_integrated_data(data)
+
+    stored = read_table(integrator)
+    pd.testing.assert_frame_equal(stored[data.columns].reset_index(drop=True), data)
+    assert stored["content_hash"].notna().all()
+    assert merged_batches == []
+    assert table_indexes(integrator) == [f"{INTEGRATED_TABLE}_match_id_key"]
+
+
+def test_unchanged_reload_writes_nothing(integrator, merged_batches):
+    data = make_integrated()
+    integrator._load_integrated_data(data)
+    before = read_table(integrator)
+
+    assert integrator._load_integrated_data(data)
+
+    assert merged_batches == []
+    pd.testing.assert_frame_equal(read_table(integrator), before)
+
+
+def test_only_changed_and_new_rows_are_written(integrator, merged_batches):
+    integrator._load_integrated_data(make_integrated())
+    data = make_integrated(22)
+    data.loc[[3, 7], "condition"] = "Snow"
+
+    assert integrator._load_integrated_data(data)
+
+    assert len(merged_batches) == 1
+    assert sorted(merged_batches[0]["match_id"]) == [3, 7, 20, 21]
+    stored = read_table(integrator)
+    pd.testing.assert_frame_equal(stored[data.columns].reset_index(drop=True), data)
+
+
+def test_legacy_table_is_rewritten_with_key(integrator, merged_batches):
+    make_integrated().drop(columns="condition").to_sql(INTEGRATED_TABLE, integrator.db_engine, index=False)
+    data = make_integrated()
+
+    assert integrator._load_integrated_data(data)
+
+    stored = read_table(integrator)
+    assert "content_hash" in stored.columns
+    pd.testing.assert_frame_equal(stored[data.columns].reset_index(drop=True), data)
+    assert merged_batches == []
+    assert table_indexes(integrator) == [f"{INTEGRATED_TABLE}_match_id_key"]
+
+    # The recreated index makes the next load an upsert again
+    data.loc[0, "condition"] = "Snow"
+    assert integrator._load_integrated_data(data)
+    assert [list(batch["match_id"]) for batch in merged_batches] == [[0]]
+
+
+def write_sources(n=1000):
+    """Write n JSON-lines matches plus odds and weather CSVs under the working directory."""
+    import json
+    import os
+
+    import numpy as np
+
+    rng = np.random.RandomState(0)
+    os.makedirs("data/raw", exist_ok=True)
+    os.makedirs("data/processed", exist_ok=True)
+    teams = ["Man Utd", "Spurs", "Arsenal", "Chelsea", "Everton", "Newcastle"]
+    matches = [{
+        "match_id": i,
+        "match_date": f"20{10 + i % 13}-0{1 + i % 9}-1{i % 9}",
+        "home_team": teams[i % 6],
+        "away_team": teams[(i + 1 + i % 5) % 6],
+        "comp": ["EPL", "Cup", None][i % 3],
+        "stats": {"home_xg": float(rng.rand()) if i % 7 else None, "away_xg": float(rng.rand()),
+                  "home_shots": int(rng.randint(0, 20))},
+    } for i in range(n)]
+    with open("data/raw/fbref_matches.json", "w") as f:
+        json.dump(matches, f)
+    with open("data/raw/fbref_matches.jsonl", "w") as f:
+        f.writelines(json.dumps(match) + "\n" for match in matches)
+
+    odds_ids = np.repeat(np.arange(n), 3)
+    odds = pd.DataFrame({"match_id": odds_ids, "home_win_odds": rng.uniform(1.5, 4, len(odds_ids)),
+                         "draw_odds": rng.uniform(3, 4, len(odds_ids)), "away_win_odds": rng.uniform(1.5, 5, len(odds_ids))})
+    odds[odds.match_id % 11 != 0].to_csv("data/processed/latest_odds.csv", index=False)
+
+    weather_ids = np.arange(0, n, 2)
+    pd.DataFrame({"match_id": weather_ids, "temperature_c": rng.randint(0, 30, len(weather_ids)).astype(float),
+                  "condition": rng.choice(["Rain", "Sun"], len(weather_ids))}).to_csv(
+        "data/processed/match_weather.csv", index=False)
+
+
+def test_streaming_refresh_matches_full_refresh(integrator):
+    write_sources()
+    assert integrator.full_data_refresh()
+    full = read_table(integrator).reset_index(drop=True)
+
+    with integrator.db_engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE {INTEGRATED_TABLE}"))
+    assert integrator.full_data_refresh(streaming=True, chunk_size=250)
+    streamed = read_table(integrator).reset_index(drop=True)
+
+    assert set(streamed.columns) == set(full.columns)
+    pd.testing.assert_frame_equal(streamed[full.columns].drop(columns="content_hash"),
+                                  full.drop(columns="content_hash"), check_exact=True)
+
+
+def test_switching_refresh_mode_keeps_unchanged_rows(integrator, merged_batches):
+    write_sources()
+    assert integrator.full_data_refresh(streaming=True, chunk_size=250)
+
+    assert integrator.full_data_refresh()
+
+    assert merged_batches == []
+
+
+def test_interrupted_streaming_rewrite_keeps_old_table(integrator, monkeypatch):
+    write_sources()
+    legacy = make_integrated()
+    legacy.to_sql(INTEGRATED_TABLE, integrator.db_engine, index=False)
+    iter_integrated_chunks = integrator._iter_integrated_chunks
+
+    def failing_chunks(*args, **kwargs):
+        for i, chunk in enumerate(iter_integrated_chunks(*args, **kwargs)):
+            if i == 2:
+                raise RuntimeError("source went away")
+            yield chunk
+
+    monkeypatch.setattr(integrator, "_iter_integrated_chunks", failing_chunks)
+
+    assert not integrator.full_data_refresh(streaming=True, chunk_size=250)
+
+    pd.testing.assert_frame_equal(read_table(integrator).reset_index(drop=True), legacy)
+    with integrator.db_engine.connect() as conn:
+        tables = [row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))]
+    assert tables == [INTEGRATED_TABLE]
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+from preprocessing.data_processing import RollingFeatureState, prepare_model_data, prepare_model_data_incremental
+
+ROLLING_COLS = ["gf_rolling", "ga_rolling", "sh_rolling", "sot_rolling"]
+
+
+def make_matches(n_rounds=20, seed=0):
+    rng = np.random.RandomState(seed)
+    teams = ["Arsenal", "Chelsea", "Everton", "Fulham"]
+    rows = []
+    for i in range(n_rounds):
+        date = pd.Timestamp("2023-08-01") + pd.Timedelta(days=7 * i)
+        for team in teams:
+            opponent = teams[(teams.index(team) + i % 3 + 1) % len(teams)]
+            gf, ga = rng.randint(0, 4, size=2)
+            rows.append({"date": date, "time": "15:00", "team": team, "opponent": opponent,
+                         "venue": "Home" if i % 2 else "Away", "result": "W" if gf > ga else ("D" if gf == ga else "L"),
+                         "gf": gf, "ga": ga, "sh": rng.randint(5, 20), "sot": rng.randint(0, 8)})
+    return pd.DataFrame(rows)
+
+
+def count_fits(monkeypatch):
+    calls = []
+    fit = RollingFeatureState.fit
+
+    def counting_fit(self, df):
+        calls.append(len(df))
+        return fit(self, df)
+
+    monkeypatch.setattr(RollingFeatureState, "fit", counting_fit)
+    return calls
+
+
+def assert_matches_full_run(processed, data):
+    full = prepare_model_data(data.copy())
+    assert list(processed.columns) == list(full.columns)
+    np.testing.assert_allclose(processed[ROLLING_COLS], full[ROLLING_COLS], atol=1e-9)
+
+
+def test_appended_matches_are_processed_incrementally(monkeypatch):
+    data = make_matches()
+    fits = count_fits(monkeypatch)
+    _, state = prepare_model_data_incremental(data.iloc[:60].copy())
+
+    processed, state = prepare_model_data_incremental(data.iloc[:70].copy(), state)
+    processed, state = prepare_model_data_incremental(data.copy(), state)
+
+    assert fits == [60]
+    assert state.rows_seen == len(data)
+    assert state.verify()
+    assert_matches_full_run(processed, data)
+
+
+def test_unchanged_history_is_not_reprocessed(monkeypatch):
+    data = make_matches()
+    fits = count_fits(monkeypatch)
+    first, state = prepare_model_data_incremental(data.copy())
+
+    processed, state = prepare_model_data_incremental(data.copy(), state)
+
+    assert fits == [len(data)]
+    pd.testing.assert_frame_equal(processed, first)
+
+
+def test_out_of_order_matches_fall_back_to_full_recompute(monkeypatch):
+    data = make_matches()
+    fits = count_fits(monkeypatch)
+    _, state = prepare_model_data_incremental(data.iloc[20:].copy())
+
+    processed, state = prepare_model_data_incremental(data.copy(), state)
+
+    assert fits == [len(data) - 20, len(data)]
+    assert_matches_full_run(processed, data)
+
+
+def test_late_matches_appended_after_history_fall_back_to_full_recompute(monkeypatch):
+    data = make_matches()
+    fits = count_fits(monkeypatch)
+    _, state = prepare_model_data_incremental(data.iloc[20:].copy())
+
+    shuffled = pd.concat([data.iloc[20:], data.iloc[:20]], ignore_index=True)
+    processed, state = prepare_model_data_incremental(shuffled.copy(), state)
+
+    assert fits == [len(data) - 20, len(data)]
+    assert_matches_full_run(processed, shuffled)